@@ -0,0 +1,343 @@
+#!/bin/env python3
+
+""" Microbenchmarks for the cache, list loading and selection hot paths.
+
+Synthetic "emojis.json", favorites and recents files are generated at the
+given sizes (realistic is about 4k entries, stress sizes are 100k and 1M) and
+cached in a temporary directory. Each case reports the best time of several
+runs and the peak of Python memory allocations of one run, measured with
+tracemalloc. Results can be saved as baseline and later checked against it,
+so a change in the hot paths shows up as a regression.
+
+Usage:
+    python3 benchmarks/bench.py                   print results
+    python3 benchmarks/bench.py --save            store baseline.json
+    python3 benchmarks/bench.py --check           fail on regressions
+    python3 benchmarks/bench.py --sizes 1000000   run stress size only
+"""
+
+import os
+import sys
+import argparse
+import json
+import random
+import tempfile
+import time
+import tracemalloc
+
+from pathlib import Path
+from typing import Callable
+
+ROOT: Path = Path(__file__).resolve().parent.parent
+BASELINE: Path = Path(__file__).resolve().parent / 'baseline.json'
+DATA_DIR: Path = Path(tempfile.gettempdir()) / 'emojicherrypick-bench'
+
+sys.path.insert(0, str(ROOT))
+import emojicherrypick  # noqa: E402
+
+WORDS: tuple[str, ...] = (
+    'smiling', 'face', 'heart', 'red', 'blue', 'green', 'yellow', 'cat',
+    'dog', 'mouse', 'hand', 'thumbs', 'up', 'down', 'raised', 'pointing',
+    'right', 'left', 'star', 'sun', 'moon', 'cloud', 'rain', 'snow', 'fire',
+    'water', 'tree', 'flower', 'leaf', 'apple', 'cherries', 'cake', 'cup',
+    'ball', 'flag', 'car', 'train', 'boat', 'house', 'pick', 'hammer', 'key',
+    'lock', 'bell', 'book', 'pen', 'phone', 'computer', 'clock', 'music',
+    'note', 'party', 'popper', 'crying', 'laughing', 'tears', 'joy', 'eyes',
+    'open', 'mouth', 'with', 'and', 'of', 'man', 'woman', 'person', 'light',
+    'dark', 'medium', 'old', 'new', 'big', 'small', 'broken', 'sparkling',
+)
+CATEGORIES: tuple[str, ...] = (
+    'Smileys & Emotion (face-smiling)',
+    'Smileys & Emotion (face-affection)',
+    'Smileys & Emotion (heart)',
+    'People & Body (hand-fingers-open)',
+    'People & Body (hand-fingers-closed)',
+    'People & Body (person)',
+    'Animals & Nature (animal-mammal)',
+    'Animals & Nature (plant-flower)',
+    'Food & Drink (food-fruit)',
+    'Travel & Places (transport-ground)',
+    'Activities (event)',
+    'Objects (tool)',
+    'Symbols (geometric)',
+    'Flags (country-flag)',
+)
+SKIN_TONES: tuple[str, ...] = (
+    'light skin tone', 'medium skin tone', 'dark skin tone',
+)
+PATTERNS: tuple[str, ...] = ('heart', 'smiling face', 'thu', 'red cat')
+
+
+def generate(size: int, seed: int = 1) -> Path:
+    """ Create synthetic database, favorites and recents for a size once. """
+
+    directory: Path = DATA_DIR / str(size)
+    source: Path = directory / 'emojis.json'
+    if source.exists():
+        return directory
+    directory.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+    lines: list[str] = []
+    temp: Path = source.with_suffix('.tmp')
+    with open(temp, 'w', encoding='utf-8') as file:
+        file.write('{"emojis": [\n')
+        for number in range(size):
+            emoji: str = chr(0x1F300 + number % 0x300) + chr(0x4E00
+                                                            + number // 0x300)
+            name: str = ' '.join(rng.choices(WORDS, k=rng.randint(1, 4)))
+            if rng.random() < 0.15:
+                name += ': ' + rng.choice(SKIN_TONES)
+            category: str = rng.choice(CATEGORIES)
+            record: dict = {
+                'emoji': emoji,
+                'name': name,
+                'shortname': ':' + name.replace(' ', '_') + ':',
+                'unicode': '',
+                'html': '',
+                'category': category,
+                'order': str(number + 1),
+            }
+            if number:
+                file.write(',\n')
+            file.write(json.dumps(record, ensure_ascii=False))
+            if len(lines) < 200 and 'skin' not in name:
+                lines.append(f'{emoji} {name} ~ {category}')
+        file.write('\n]}\n')
+    temp.rename(source)
+    favorites: list[str] = rng.sample(lines, min(40, len(lines)))
+    (directory / 'favorites.cherry').write_text('\n'.join(favorites))
+    recents: list[str] = rng.choices(lines, k=400)
+    (directory / 'recents.cherry').write_text('\n'.join(recents))
+    return directory
+
+
+def make_app(directory: Path) -> emojicherrypick.App:
+    """ Construct the application on a synthetic cache, offline. """
+
+    cache_dir: Path = directory / 'cache'
+    cache_dir.mkdir(exist_ok=True)
+    source: Path = cache_dir / 'emojis.json'
+    if not source.exists():
+        os.link(directory / 'emojis.json', source)
+    args = emojicherrypick.parse_arguments([
+        '--offline',
+        '--cache-dir', str(cache_dir),
+        '--favorites', str(directory / 'favorites.cherry'),
+        '--recents', str(cache_dir / 'recents.cherry'),
+        '--recents-size', '10',
+        '--menu', 'filter',
+    ])
+    return emojicherrypick.App(args)
+
+
+def recents_store(directory: Path, appended: int) -> bytes:
+    """ Get recents file of the synthetic uses with some not compacted. """
+
+    uses: list[str] = (directory / 'recents.cherry').read_text().splitlines()
+    path: Path = directory / 'recents.store'
+    emojicherrypick.Recents(path, '\n'.join(uses[:-appended])).compact()
+    stamp: float = time.time()
+    with open(path, 'a') as file:
+        for line in uses[-appended:]:
+            file.write(f'+{stamp:.0f}\t{line}\n')
+    data: bytes = path.read_bytes()
+    path.unlink()
+    return data
+
+
+def reset_index(app: emojicherrypick.App) -> None:
+    """ Forget opened index files, so they are read again. """
+
+    if app.index:
+        app.index.close()
+    app.index = None
+    app.tokens = None
+    app.memo = None
+
+
+def cases(app: emojicherrypick.App,
+          directory: Path) -> dict[str, tuple[Callable, Callable]]:
+    """ Benchmark cases as pairs of untimed setup and timed function. """
+
+    # Uses appended since last compaction, below and above the size
+    # which triggers the next compaction.
+    recents: bytes = recents_store(directory, 40)
+    recents_big: bytes = recents_store(directory, 120)
+    assert app.db_index and app.db_tokens and app.db_recents
+
+    def cold_cache() -> None:
+        reset_index(app)
+        app.db_index.unlink(missing_ok=True)
+        app.db_tokens.unlink(missing_ok=True)
+
+    def warm_cache() -> None:
+        reset_index(app)
+
+    def warm_memo() -> None:
+        if app.memo is None:
+            app.memo = {}
+            app.load_emoji_list()
+
+    def restore_recents() -> None:
+        app.db_recents.write_bytes(recents)
+
+    def cold_snapshot() -> None:
+        restore_recents()
+        reset_index(app)
+        app.db_source.with_suffix('.list').unlink(missing_ok=True)
+
+    def warm_snapshot() -> None:
+        restore_recents()
+        reset_index(app)
+
+    def read_snapshot_list() -> None:
+        # Chunks are passed on like to a menu, not joined.
+        for _ in app.iter_snapshot_list():
+            pass
+
+    def restore_recents_big() -> None:
+        app.db_recents.write_bytes(recents_big)
+
+    def compact_recents() -> None:
+        recents = emojicherrypick.Recents(app.db_recents)
+        recents.load()
+        recents.compact()
+
+    def select_filter() -> None:
+        for pattern in PATTERNS:
+            app.pattern = pattern
+            app.select_by_filter()
+
+    picker: list[emojicherrypick.IncrementalSearch] = []
+
+    def new_picker() -> None:
+        # The menu folds all lines, while it waits for the first key.
+        picker[:] = [emojicherrypick.IncrementalSearch(
+            app.load_emoji_list(aslist=True))]
+        picker[0].fold()
+
+    def type_patterns() -> None:
+        # Each key of the pattern typed and deleted again.
+        search: emojicherrypick.IncrementalSearch = picker[0]
+        for pattern in PATTERNS:
+            for size in [*range(1, len(pattern) + 1),
+                         *range(len(pattern) - 1, -1, -1)]:
+                search.search(pattern[:size])
+
+    return {
+        'filter_db_source cold': (cold_cache, app.filter_db_source),
+        'filter_db_source warm': (warm_cache, app.filter_db_source),
+        'load_emoji_list cold': (warm_cache, app.load_emoji_list),
+        'load_emoji_list warm': (warm_memo, app.load_emoji_list),
+        'iter_snapshot_list cold': (cold_snapshot, read_snapshot_list),
+        'iter_snapshot_list warm': (warm_snapshot, read_snapshot_list),
+        'compact_recents': (restore_recents_big, compact_recents),
+        'select_by_filter': (restore_recents, select_filter),
+        'incremental_search keys': (new_picker, type_patterns),
+        'select_by_random': (restore_recents, app.select_by_random),
+    }
+
+
+def measure(setup: Callable, function: Callable,
+            min_time: float = 0.2, max_runs: int = 50) -> dict[str, float]:
+    """ Best time in ms of several runs and peak allocations in KiB. """
+
+    times: list[float] = []
+    while len(times) < 3 or (sum(times) < min_time * 1000
+                             and len(times) < max_runs):
+        setup()
+        start: float = time.perf_counter()
+        function()
+        times.append((time.perf_counter() - start) * 1000)
+    setup()
+    tracemalloc.start()
+    try:
+        function()
+        peak: int = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'time_ms': round(min(times), 3), 'peak_kib': round(peak / 1024)}
+
+
+def run(sizes: list[int], only: str | None) -> dict[str, dict]:
+    """ Run all cases for all sizes and print each result. """
+
+    results: dict[str, dict] = {}
+    print(f'{"case":<36} {"time ms":>10} {"peak KiB":>10}')
+    for size in sizes:
+        directory: Path = generate(size)
+        app: emojicherrypick.App = make_app(directory)
+        for name, (setup, function) in cases(app, directory).items():
+            key: str = f'{size}/{name}'
+            if only and only not in key:
+                continue
+            result: dict[str, float] = measure(setup, function)
+            results[key] = result
+            print(f'{key:<36} {result["time_ms"]:>10.3f} '
+                  f'{result["peak_kib"]:>10}')
+        reset_index(app)
+    return results
+
+
+def check(results: dict[str, dict], baseline: dict[str, dict],
+          tolerance: float) -> list[str]:
+    """ List all results slower or bigger than baseline plus tolerance. """
+
+    regressions: list[str] = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        base: dict[str, float] = baseline[key]
+        # Absolute slack, so tiny cases are not flagged for noise.
+        if result['time_ms'] > base['time_ms'] * (1 + tolerance) + 0.5:
+            regressions.append(f'{key}: time {base["time_ms"]:.3f} -> '
+                               f'{result["time_ms"]:.3f} ms')
+        if result['peak_kib'] > base['peak_kib'] * (1 + tolerance) + 64:
+            regressions.append(f'{key}: peak {base["peak_kib"]} -> '
+                               f'{result["peak_kib"]} KiB')
+    return regressions
+
+
+def main(args: list[str]) -> int:
+    """ Read options, run benchmarks and save or check the baseline. """
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='4000,100000',
+                        help='comma separated list of database sizes')
+    parser.add_argument('--only', metavar='TEXT',
+                        help='run cases with TEXT in "size/case" only')
+    parser.add_argument('--save', action='store_true',
+                        help='write results to baseline.json')
+    parser.add_argument('--check', action='store_true',
+                        help='exit with 1 if slower or bigger than baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed relative regression, default 0.25')
+    options = parser.parse_args(args)
+
+    sizes: list[int] = [int(size) for size in options.sizes.split(',')]
+    results: dict[str, dict] = run(sizes, options.only)
+
+    if options.save:
+        baseline: dict[str, dict] = {}
+        if BASELINE.exists():
+            baseline = json.loads(BASELINE.read_text())
+        baseline.update(results)
+        BASELINE.write_text(json.dumps(baseline, indent=2, sort_keys=True)
+                            + '\n')
+        print(f'saved {BASELINE.relative_to(ROOT)}')
+    if options.check:
+        if not BASELINE.exists():
+            print(f'{BASELINE.relative_to(ROOT)} not found, run with --save')
+            return 1
+        regressions: list[str] = check(results,
+                                       json.loads(BASELINE.read_text()),
+                                       options.tolerance)
+        for regression in regressions:
+            print('regression:', regression)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
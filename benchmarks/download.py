@@ -0,0 +1,151 @@
+#!/bin/env python3
+
+""" Check the conditional download against a local HTTP server.
+
+Serves the synthetic database of bench.py with http.server and runs the
+download with status 200, 304 and 503. Checks that a changed file is
+downloaded, that an unchanged file costs only headers, and that a server
+error keeps the cached file, both for download_file() and a whole run of the
+program with "--refresh-after".
+
+Usage: python3 benchmarks/download.py
+"""
+
+import sys
+import argparse
+import http.server
+import shutil
+import threading
+import urllib.error
+
+from pathlib import Path
+
+import bench
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    """ Serve one file with an ETag, or fail with the forced status. """
+
+    data: bytes = b''
+    etag: str = '"1"'
+    status: int = 200
+    sent: list[int] = []
+
+    def do_GET(self) -> None:
+        if Handler.status != 200:
+            self.send_error(Handler.status)
+            Handler.sent.append(Handler.status)
+            return
+        if self.headers.get('If-None-Match') == Handler.etag:
+            self.send_response(304)
+            self.end_headers()
+            Handler.sent.append(304)
+            return
+        self.send_response(200)
+        self.send_header('ETag', Handler.etag)
+        self.send_header('Content-Length', str(len(Handler.data)))
+        self.end_headers()
+        self.wfile.write(Handler.data)
+        Handler.sent.append(200)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+def check_download(url: str, directory: Path) -> list[str]:
+    """ Download with each status, get problems found. """
+
+    emojicherrypick = bench.emojicherrypick
+    path: Path = directory / 'emojis.json'
+    meta: Path = directory / 'emojis.meta'
+    problems: list[str] = []
+
+    Handler.status = 200
+    if not emojicherrypick.download_file(url, path, meta):
+        problems.append('200: file not downloaded')
+    if path.read_bytes() != Handler.data:
+        problems.append('200: file differs from served data')
+
+    if emojicherrypick.download_file(url, path, meta):
+        problems.append('304: unchanged file downloaded again')
+    if Handler.sent[-1] != 304:
+        problems.append(f'304: server sent {Handler.sent[-1]}')
+
+    Handler.status = 503
+    checked: float = emojicherrypick.load_meta(meta)['checked']
+    try:
+        if emojicherrypick.download_file(url, path, meta):
+            problems.append('503: reported a new file')
+    except urllib.error.HTTPError as error:
+        problems.append(f'503: raised with cached file: {error}')
+    if path.read_bytes() != Handler.data:
+        problems.append('503: cached file changed')
+    if emojicherrypick.load_meta(meta)['checked'] <= checked:
+        problems.append('503: time of check not recorded')
+    if list(directory.glob('*.tmp')):
+        problems.append('503: temporary file left')
+
+    path.unlink()
+    try:
+        emojicherrypick.download_file(url, path, meta)
+        problems.append('503: no error without cached file')
+    except urllib.error.HTTPError:
+        pass
+    Handler.status = 200
+    return problems
+
+
+def check_run(url: str, directory: Path) -> list[str]:
+    """ Run the program on a cached file while the server fails. """
+
+    emojicherrypick = bench.emojicherrypick
+    args: list[str] = ['--url', url, '--cache-dir', str(directory),
+                       '--refresh-after', '0.000001', '--nobundle',
+                       '--menu', 'none', '-OCTNRF']
+    problems: list[str] = []
+    Handler.status = 200
+    if emojicherrypick.main(args):
+        problems.append('run: failed with status 200')
+    Handler.status = 503
+    try:
+        code: int = emojicherrypick.main(args)
+        if code:
+            problems.append(f'run: exit {code} with status 503')
+    except urllib.error.HTTPError as error:
+        problems.append(f'run: raised with status 503: {error}')
+    Handler.status = 200
+    return problems
+
+
+def main(args: list[str]) -> int:
+    """ Start the server, run all checks and report the results. """
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.parse_args(args)
+
+    data_dir: Path = bench.generate(4000)
+    Handler.data = (data_dir / 'emojis.json').read_bytes()
+    directory: Path = data_dir / 'download'
+    shutil.rmtree(directory, ignore_errors=True)
+    directory.mkdir()
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url: str = f'http://127.0.0.1:{server.server_address[1]}/emojis.json'
+    try:
+        problems: list[str] = check_download(url, directory / 'file')
+        problems += check_run(url, directory / 'run')
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    for problem in problems:
+        print(problem)
+    print(f'download with status 200, 304 and 503: '
+          f'{"FAIL" if problems else "ok"}')
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
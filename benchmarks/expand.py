@@ -0,0 +1,88 @@
+#!/bin/env python3
+
+""" Throughput benchmark of the "--expand" shortcode mode.
+
+Generates a chat log like text with shortcodes of the synthetic database
+of bench.py, then runs "emojicherrypick --expand" on it and reports the
+throughput in MB/s and the peak memory of the process, which should be the
+same for any input size.
+
+Usage: python3 benchmarks/expand.py [--size MB] [--entries NUM]
+"""
+
+import sys
+import argparse
+import random
+import resource
+import subprocess
+import time
+
+from pathlib import Path
+
+import bench
+
+WORDS: tuple[str, ...] = bench.WORDS + ('12:30:45', 'a:b', '::', 'http://x')
+
+
+def generate_text(path: Path, size: int, codes: list[bytes],
+                  seed: int = 1) -> None:
+    """ Write text of about size bytes, with a shortcode in every 25 words. """
+
+    rng = random.Random(seed)
+    words: list[bytes] = [word.encode() for word in WORDS]
+    unknown: list[bytes] = [b':no_such_code:', b':smile']
+    written: int = 0
+    with open(path, 'wb') as file:
+        while written < size:
+            line: list[bytes] = []
+            for _ in range(rng.randint(3, 40)):
+                roll: float = rng.random()
+                if roll < 0.04:
+                    line.append(rng.choice(codes))
+                elif roll < 0.05:
+                    line.append(rng.choice(unknown))
+                else:
+                    line.append(rng.choice(words))
+            data: bytes = b' '.join(line) + b'\n'
+            file.write(data)
+            written += len(data)
+
+
+def main(args: list[str]) -> int:
+    """ Generate input, run expand mode and report throughput. """
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, default=64,
+                        help='input size in MB, default 64')
+    parser.add_argument('--entries', type=int, default=4000,
+                        help='size of the synthetic database, default 4000')
+    options = parser.parse_args(args)
+
+    directory: Path = bench.generate(options.entries)
+    app = bench.make_app(directory)
+    index = app.open_index()
+    codes: list[bytes] = index.shortcode_list() if index else []
+    size: int = options.size * 1000 * 1000
+    text: Path = directory / f'expand-{options.size}.txt'
+    if not text.exists() or text.stat().st_size < size:
+        generate_text(text, size, codes)
+    size = text.stat().st_size
+
+    command: list[str] = [sys.executable,
+                          str(bench.ROOT / 'emojicherrypick.py'),
+                          '--offline', '--cache-dir', str(app.cache_dir),
+                          '--expand']
+    with open(text, 'rb') as source:
+        start: float = time.perf_counter()
+        subprocess.run(command, stdin=source, stdout=subprocess.DEVNULL,
+                       check=True)
+        elapsed: float = time.perf_counter() - start
+    peak: int = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    print(f'input {size / 1e6:.1f} MB, {len(codes)} shortcodes')
+    print(f'expand: {size / 1e6 / elapsed:.1f} MB/s, {elapsed:.2f} s, '
+          f'peak RSS {peak / 1024:.1f} MiB')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,97 @@
+#!/bin/env python3
+
+""" Check the startup budget of emojicherrypick.
+
+Measures the cumulative import time of the module with
+"python -X importtime" and fails if it is above the budget, or if modules
+only needed on cold or uncommon code paths are imported at startup.  If the
+PyInstaller build exists in ./dist, its "--offline --version" run is timed
+as well.
+
+Usage: python3 benchmarks/importtime.py [BUDGET_MS] [BINARY_BUDGET_MS]
+"""
+
+import sys
+import subprocess
+import time
+
+from pathlib import Path
+
+ROOT: Path = Path(__file__).resolve().parent.parent
+MODULE: str = 'emojicherrypick'
+BINARY: Path = ROOT / 'dist' / MODULE
+
+# Modules which must not be imported by the default invocation.
+FORBIDDEN: tuple[str, ...] = (
+    'argparse',
+    'email',
+    'http',
+    'json',
+    'pickle',
+    'random',
+    'shutil',
+    'socket',
+    'ssl',
+    'tempfile',
+    'urllib.request',
+)
+
+
+def import_times() -> dict[str, int]:
+    """ Cumulative import time in microseconds for each imported module. """
+
+    command: list[str] = [sys.executable, '-X', 'importtime',
+                          '-c', f'import {MODULE}']
+    process = subprocess.run(command, cwd=ROOT, capture_output=True,
+                             text=True, check=True)
+    times: dict[str, int] = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def main(args: list[str]) -> int:
+    """ Run the checks and report the results. """
+
+    budget_ms: float = float(args[0]) if args else 50.0
+    binary_budget_ms: float = float(args[1]) if len(args) > 1 else 250.0
+    failed: bool = False
+
+    # The best of several runs, to hide noise from a busy machine.
+    times: dict[str, int] = min((import_times() for _ in range(5)),
+                                key=lambda times: times[MODULE])
+    module_ms: float = times[MODULE] / 1000
+    print(f'import {MODULE}: {module_ms:.1f} ms (budget {budget_ms:.1f} ms)')
+    if module_ms > budget_ms:
+        failed = True
+        print('  over budget')
+    imported: list[str] = [name for name in FORBIDDEN if name in times]
+    if imported:
+        failed = True
+        print(f'  imported at startup: {", ".join(imported)}')
+
+    if BINARY.exists():
+        elapsed: list[float] = []
+        for _ in range(5):
+            start: float = time.perf_counter()
+            subprocess.run([BINARY, '--offline', '--version'],
+                           capture_output=True, check=True)
+            elapsed.append((time.perf_counter() - start) * 1000)
+        binary_ms: float = min(elapsed)
+        print(f'{BINARY.relative_to(ROOT)} --offline --version: '
+              f'{binary_ms:.1f} ms '
+              f'(budget {binary_budget_ms:.1f} ms)')
+        if binary_ms > binary_budget_ms:
+            failed = True
+            print('  over budget')
+    else:
+        print(f'{BINARY.relative_to(ROOT)} not found, run "make dist" first')
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
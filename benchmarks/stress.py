@@ -0,0 +1,113 @@
+#!/bin/env python3
+
+""" Multi-process stress test of the shared cache files.
+
+Starts many processes at the same time on a cold cache of the synthetic
+database of bench.py, each selects an emoji with "--menu filter" and adds
+it to recents. Checks that all processes succeed, that the binary index was
+built only once per round, that no use of recents was lost, even while the
+file is compacted, and that no temporary files are left behind.
+
+Usage: python3 benchmarks/stress.py [--processes NUM] [--rounds NUM]
+"""
+
+import sys
+import argparse
+import shutil
+import subprocess
+
+from pathlib import Path
+
+import bench
+
+# Runs the program and logs each build of the binary index to a file.
+RUNNER: str = '''
+import sys
+import emojicherrypick
+
+write = emojicherrypick.CherryIndex.write
+
+
+def counted_write(path, *args, **kwargs):
+    with open(sys.argv[1], 'a') as log:
+        log.write('build\\n')
+    return write(path, *args, **kwargs)
+
+
+emojicherrypick.CherryIndex.write = counted_write
+sys.exit(emojicherrypick.main(sys.argv[2:]))
+'''
+
+PATTERNS: tuple[str, ...] = ('heart', 'cat', 'dog', 'star', 'moon', 'cake',
+                             'party', 'fire')
+
+
+def run_round(cache_dir: Path, processes: int, log: Path) -> list[str]:
+    """ Start all processes on a cold cache, get problems found. """
+
+    for name in ('emojis.idx', 'emojis.tok'):
+        (cache_dir / name).unlink(missing_ok=True)
+    log.unlink(missing_ok=True)
+    running: list[subprocess.Popen] = []
+    for number in range(processes):
+        command: list[str] = [
+            sys.executable, '-c', RUNNER, str(log),
+            '--offline', '--cache-dir', str(cache_dir),
+            '--recents', str(cache_dir / 'recents.cherry'),
+            '--nofavorites', '--menu', 'filter',
+            '--pattern', PATTERNS[number % len(PATTERNS)], '--stdout']
+        running.append(subprocess.Popen(command, cwd=bench.ROOT,
+                                        stdout=subprocess.PIPE,
+                                        stderr=subprocess.PIPE, text=True))
+    problems: list[str] = []
+    for process in running:
+        stdout, stderr = process.communicate()
+        if process.returncode or not stdout.strip():
+            problems.append(f'exit {process.returncode}: {stderr.strip()}')
+    builds: int = len(log.read_text().splitlines()) if log.exists() else 0
+    if builds != 1:
+        problems.append(f'index was built {builds} times')
+    return problems
+
+
+def main(args: list[str]) -> int:
+    """ Run all rounds and report the results. """
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--processes', type=int, default=16,
+                        help='processes started at once, default 16')
+    parser.add_argument('--rounds', type=int, default=20,
+                        help='number of cold starts, default 20')
+    options = parser.parse_args(args)
+
+    directory: Path = bench.generate(4000)
+    cache_dir: Path = directory / 'stress'
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    cache_dir.mkdir()
+    shutil.copy(directory / 'emojis.json', cache_dir / 'emojis.json')
+    log: Path = directory / 'stress.log'
+
+    problems: list[str] = []
+    for number in range(options.rounds):
+        for problem in run_round(cache_dir, options.processes, log):
+            problems.append(f'round {number + 1}: {problem}')
+
+    recents = bench.emojicherrypick.Recents(cache_dir / 'recents.cherry')
+    recents.load()
+    uses: int = sum(count for _, count, _ in recents.entries.values())
+    expected: int = options.processes * options.rounds
+    if uses != expected:
+        problems.append(f'recents have {uses} uses, expected {expected}')
+    leftovers: list[str] = [path.name for path in cache_dir.glob('*.tmp')]
+    if leftovers:
+        problems.append(f'temporary files left: {", ".join(leftovers)}')
+
+    for problem in problems:
+        print(problem)
+    print(f'{options.rounds} rounds of {options.processes} processes: '
+          f'{"FAIL" if problems else "ok"}')
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
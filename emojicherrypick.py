@@ -1,19 +1,37 @@
 #!/bin/env python3
 
+from __future__ import annotations
+
 import sys
 import os
-import shutil
-import argparse
-import json
-import urllib.request
-import subprocess
-import random
+import time
+import types
+import re
+import mmap
+import struct
+import bisect
+import array
+import heapq
+import itertools
+import math
+import operator
 
 from pathlib import Path
-from typing import Tuple
-from typing import TypeAlias
+from collections.abc import Callable
+from collections.abc import Iterable
+from collections.abc import Iterator
+from collections.abc import Mapping
+from collections.abc import Sequence
+from typing import TYPE_CHECKING
 
-CompletedProcess: TypeAlias = subprocess.CompletedProcess
+# Other modules are imported where they are used, to keep startup fast.
+# Annotations name them only for type checkers.
+if TYPE_CHECKING:
+    import argparse
+    import curses
+    import socket
+    import subprocess
+    from typing import TextIO
 
 
 class App:
@@ -25,6 +43,7 @@ class App:
     def __init__(self, args: argparse.Namespace) -> None:
         """ Construct application attributes used as settings. """
 
+        self.timings: Timings = Timings()
         self.list_version: bool = args.version
         self.frozen: bool = bool(getattr(sys, 'frozen', False)
                                  and hasattr(sys, '_MEIPASS'))
@@ -32,12 +51,39 @@ class App:
         self.offline: bool = args.offline
         self.menu: str = args.menu
         self.url: str = args.url
+        self.sources: list[str] = list(args.source)
         self.cache_dir: Path = fullpath(args.cache_dir)
         self.db_source: Path = Path(self.cache_dir / 'emojis.json')
+        self.sources_dir: Path = self.cache_dir / 'sources'
+        self.db_source_meta: Path = self.db_source.with_suffix('.meta')
+        self.refresh_after: float = args.refresh_after
+        self.refresh_background: bool = args.refresh_background
+        self.refresh_marker: Path = self.db_source.with_suffix('.refresh')
+        self.cache_lock: Path = self.db_source.with_suffix('.lock')
         self.noemojis: bool = args.noemojis
-        self.db_filtered: Path | None = None
+        self.db_index: Path | None = None
         if not self.noemojis:
-            self.db_filtered = self.db_source.with_suffix('.cherry')
+            self.db_index = self.db_source.with_suffix('.idx')
+        # Precompiled index shipped with the program, built from the default
+        # URL, so it is only used for that.
+        self.db_bundle: Path | None = None
+        if (self.db_index
+                and not args.nobundle
+                and not self.sources
+                and self.url == DEFAULTS['url']):
+            bundle_dir: Path = (Path(getattr(sys, '_MEIPASS')) if self.frozen
+                                else Path(__file__).resolve().parent)
+            self.db_bundle = bundle_dir / 'emojis.idx'
+        self.backend: str = args.backend
+        self.db_tokens: Path | None = None
+        if self.db_index and self.backend == 'files':
+            self.db_tokens = self.db_index.with_suffix('.tok')
+        self.db_database: Path | None = None
+        if self.backend == 'sqlite':
+            self.db_database = self.db_source.with_suffix('.db')
+        self.index: CherryIndex | None = None
+        self.tokens: TokenIndex | None = None
+        self.database: CherryDatabase | None = None
         self.nofavorites: bool = args.nofavorites
         self.db_favorites: Path | None = None
         if not self.nofavorites:
@@ -52,6 +98,8 @@ class App:
         self.list_size: int = args.list_size
         self.selected_emoji: str | None = None
         self.selected_desc: str | None = None
+        self.selected_lines: list[str] = []
+        self.matches: list[str] = []
         self.stdout: bool = args.stdout and not args.nostdout
         self.clipboard: bool = args.clipboard and not args.noclipboard
         self.notify: bool = args.notify and not args.nonotify
@@ -59,148 +107,901 @@ class App:
         self.ignore_case: bool = args.ignore_case and not args.noignore_case
         self.ignore_skin: bool = args.ignore_skin
         self.matching_rofi: str = args.matching_rofi
-        self.pattern: str = args.pattern
+        self.patterns: list[str] = list(args.pattern)
+        self.pattern: str = self.patterns[-1] if self.patterns else ''
+        self.multi: bool = args.multi
+        self.limit: int = args.limit
+        self.count: int = args.count
+        self.unique: bool = args.unique
+        self.random_weight: float = args.random_weight
+        self.seed: int | None = args.seed
+        self.batch: bool = args.batch
+        self.batch_miss: str = args.batch_miss
+        self.batch_recents: bool = args.batch_recents
+        self.expand: bool = args.expand
         self.prompt: str = args.prompt
         self.list_programs: bool = args.list_programs
-        self.programs: dict[str, Path] = {
-            'Python': Path(sys.executable),
-            'rofi': App.which(args.rofi),
-            'dmenu': App.which(args.dmenu),
-            'pmenu': App.which(args.pmenu),
-            'fzf': App.which(args.fzf),
-            'xclip': App.which(args.xclip),
-            'xdotool': App.which(args.xdotool),
-            'notify-send': App.which(args.notifysend),
-        }
+        self.list_stats: bool = args.stats
+        self.print_timings: bool = args.timings
+        self.log_timings: bool = args.timings_log
+        self.timings_log: Path = self.cache_dir / 'timings.log'
+        self.memo: dict | None = None
+        self.programs: Programs = Programs({
+            'Python': sys.executable,
+            'rofi': args.rofi,
+            'dmenu': args.dmenu,
+            'pmenu': args.pmenu,
+            'fzf': args.fzf,
+            'xclip': args.xclip,
+            'xdotool': args.xdotool,
+            'notify-send': args.notifysend,
+        }, self.cache_dir / 'programs.json', self.timings)
 
         if self.wipe_cache:
             self.wipe_cache_files()
-        if not self.offline or not self.noemojis:
-            self.download_db_source()
-        self.filter_db_source()
+        refreshing: bool = self.refresh_background
+        if not self.offline and not self.noemojis:
+            if (self.refresh_background
+                    and self.db_index
+                    and self.db_index.exists()):
+                if self.db_source_is_due():
+                    self.start_refresh()
+            elif self.bundle_in_use():
+                # Only updates of the bundled data are downloaded.
+                if self.refresh_after > 0:
+                    self.start_refresh()
+                    refreshing = True
+            else:
+                with self.timings.phase('download'):
+                    self.download_db_source()
+        elif self.sources and not self.noemojis:
+            # Local files and earlier downloads are still merged.
+            with self.timings.phase('download'):
+                self.download_db_source()
+        with self.timings.phase('cache'):
+            self.filter_db_source()
+        if not refreshing:
+            # Cache is up to date, a background refresh may start again.
+            self.refresh_marker.unlink(missing_ok=True)
+        self.timings.add('init', self.timings.elapsed())
 
     def load_emoji_list(self, aslist=False) -> str | list:
         """ Read all emojis, recents and favorites into a single string. """
 
-        emoji_list: str = ''
-        filtered_list: str = ''
-        recents_list: str = ''
-        favorites_list: str = ''
-        if (not self.norecents
+        key: tuple = (self.recents_size,
+                      self.stat_key(self.db_recents, self.norecents),
+                      self.stat_key(self.db_favorites, self.nofavorites),
+                      self.stat_key(self.db_index, self.noemojis))
+        elist: list[str]
+        cached: tuple | None = None
+        if self.memo is not None:
+            cached = self.memo.get('emoji_list')
+        if cached and cached[0] == key:
+            elist = cached[1]
+        else:
+            with self.timings.phase('load'):
+                elist = self.merge_emoji_list()
+            if self.memo is not None:
+                self.memo['emoji_list'] = (key, elist)
+        if aslist:
+            return elist
+        else:
+            return '\n'.join(elist).lstrip('\n')
+
+    def merge_emoji_list(self) -> list[str]:
+        """ Read recents, favorites and emojis, merge them without dupes. """
+
+        elist: list[str] = self.load_user_list()
+        rows: CherryIndex | CherryDatabase | None = self.open_rows()
+        if rows and len(rows):
+            elist.extend(rows.lines_text().splitlines())
+        return list(dict.fromkeys(elist))
+
+    def load_user_list(self) -> list[str]:
+        """ Read recents and favorites into a single list without dupes. """
+
+        elist: list[str] = list(dict.fromkeys(self.load_recents_list()
+                                              + self.load_favorites_list()))
+        return elist
+
+    def load_recents_list(self) -> list[str]:
+        """ Read most frecently used entries of recents file first. """
+
+        database: CherryDatabase | None = self.open_database()
+        if not self.norecents and database is not None:
+            return database.top(self.recents_size)
+        elif (not self.norecents
                 and self.db_recents
                 and self.db_recents.exists()):
-            recents_list = self.db_recents.read_text().strip('\n')
-            recents_top: list = recents_list.splitlines()
-            recents_top.reverse()
-            recents_top = list(dict.fromkeys(recents_top))
-            recents_top = recents_top[0:self.recents_size]
-            recents_list = '\n'.join(recents_top)
-        if (not self.nofavorites
+            key: tuple = (self.recents_size, self.stat_key(self.db_recents))
+            cached: tuple | None = None
+            if self.memo is not None:
+                cached = self.memo.get('recents')
+            if cached and cached[0] == key:
+                return list(cached[1])
+            recents = Recents(self.db_recents,
+                              self.read_text(self.db_recents),
+                              self.recents_size)
+            top: list[str] = recents.top(self.recents_size)
+            if self.memo is not None:
+                self.memo['recents'] = (key, top)
+            return list(top)
+        return []
+
+    def load_favorites_list(self) -> list[str]:
+        """ Read entries of favorites file. """
+
+        database: CherryDatabase | None = self.open_database()
+        if not self.nofavorites and database is not None:
+            return database.favorites()
+        elif (not self.nofavorites
                 and self.db_favorites
                 and self.db_favorites.exists()):
-            favorites_list = self.db_favorites.read_text().strip('\n')
-        if (not self.noemojis
-                and self.db_filtered
-                and self.db_filtered.exists()):
-            filtered_list = self.db_filtered.read_text().strip('\n')
-        if recents_list:
-            emoji_list += '\n' + recents_list
-        if favorites_list:
-            emoji_list += '\n' + favorites_list
-        if filtered_list:
-            emoji_list += '\n' + filtered_list
-        elist: list[str] = list(dict.fromkeys(emoji_list.splitlines()))
-        if aslist:
-            return elist
-        else:
-            emoji_list = '\n'.join(elist)
-            return emoji_list.lstrip('\n')
+            favorites_list = self.read_text(self.db_favorites).strip('\n')
+            return [line for line in favorites_list.splitlines() if line]
+        return []
+
+    def iter_emoji_list(self, chunk_size: int = 1 << 16) -> Iterator[str]:
+        """ Read recents, favorites and emojis as chunks of lines.
+
+        Each source is only read when the previous one is consumed, so a
+        menu can start with the first lines while the rest is loaded. Dupes
+        are skipped just like in load_emoji_list().
+        """
+
+        seen: set[str] = set()
+        for lines in (self.load_recents_list, self.load_favorites_list):
+            chunk: list[str] = []
+            for line in lines():
+                if line not in seen:
+                    seen.add(line)
+                    chunk.append(line + '\n')
+            if chunk:
+                yield ''.join(chunk)
+        rows: CherryIndex | CherryDatabase | None = self.open_rows()
+        if not rows or not len(rows):
+            return
+        for data in rows.iter_chunks(chunk_size):
+            text: str = str(data, 'utf-8')
+            if seen:
+                text = ''.join(line + '\n' for line in text.splitlines()
+                               if line not in seen)
+            yield text
+
+    def iter_snapshot_list(self,
+                           lower=False,
+                           chunk_size: int = 1 << 16) -> Iterator[str]:
+        """ Read recents first, then the snapshot without those entries.
+
+        The same lines as from iter_emoji_list(), in lowercase if asked.
+        Recents change on each pick, so they are not part of the snapshot
+        but cut out of each chunk of it while streaming, which is a text
+        search for each of them until it is found.
+        """
+
+        recents: list[str] = self.load_recents_list()
+        if lower:
+            recents = [line.lower() for line in recents]
+        recents = list(dict.fromkeys(recents))
+        if recents:
+            yield ''.join(line + '\n' for line in recents)
+        pending: list[str] = [line + '\n' for line in recents]
+        for text in self.iter_snapshot(lower, chunk_size):
+            if pending:
+                cuts: list[tuple[int, int]] = []
+                for entry in list(pending):
+                    # Chunks start at a line, so a match is a whole line.
+                    position: int = 0
+                    if not text.startswith(entry):
+                        position = text.find('\n' + entry) + 1
+                        if not position:
+                            continue
+                    cuts.append((position, position + len(entry)))
+                    pending.remove(entry)
+                if cuts:
+                    parts: list[str] = []
+                    done: int = 0
+                    for start, end in sorted(cuts):
+                        parts.append(text[done:start])
+                        done = end
+                    parts.append(text[done:])
+                    text = ''.join(parts)
+            yield text
+
+    def iter_snapshot(self,
+                      lower=False,
+                      chunk_size: int = 1 << 16) -> Iterator[str]:
+        """ Read favorites and emojis as menu text in chunks of lines.
+
+        The snapshot file is keyed by the path, size and modification time
+        of the favorites file and of the binary index actually opened, which
+        may be the bundled one, and the options which change the text. With
+        the database the states of index and favorites it was synced to are
+        used instead of its file, which changes on each pick. It is streamed
+        if current, else it is rebuilt while the chunks are passed on.
+        """
+
+        import zlib
+
+        path: Path = self.db_source.with_suffix(
+            '.lower.list' if lower else '.list')
+        index: CherryIndex | None = self.open_index()
+        database: CherryDatabase | None = self.open_database()
+        synced: tuple | None = None
+        if database is not None:
+            synced = (database.get_meta('index'),
+                      database.get_meta('favorites'))
+        key: str = repr((lower, self.backend, self.noemojis,
+                         self.stat_key(self.db_favorites, self.nofavorites),
+                         self.stat_key(index.path if index else None),
+                         synced))
+        header: bytes = b'#snapshot %08x\n' % zlib.crc32(key.encode())
+        try:
+            file = open(path, 'rb')
+        except OSError:
+            file = None
+        if file is not None:
+            with file:
+                if file.read(len(header)) == header:
+                    rest: bytes = b''
+                    while data := file.read(chunk_size):
+                        data = rest + data
+                        end: int = data.rfind(b'\n') + 1
+                        rest = data[end:]
+                        if end:
+                            yield str(data[:end], 'utf-8')
+                    if rest:
+                        yield str(rest, 'utf-8')
+                    return
+        yield from self.timings.iterate(
+            'snapshot', self.build_snapshot(path, header, lower, chunk_size))
+
+    def build_snapshot(self,
+                       path: Path,
+                       header: bytes,
+                       lower: bool,
+                       chunk_size: int) -> Iterator[str]:
+        """ Write the snapshot file and pass on each chunk written.
+
+        The file is only renamed into place when all was written, so a
+        menu closed early leaves no snapshot.
+        """
+
+        temp: Path = temp_path(path)
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            file = open(temp, 'wb')
+            file.write(header)
+        except OSError:
+            file = None
+        try:
+            for text in self.iter_snapshot_text(chunk_size):
+                if lower:
+                    text = text.lower()
+                if file is not None:
+                    try:
+                        file.write(text.encode('utf-8'))
+                    except OSError:
+                        file.close()
+                        file = None
+                yield text
+            if file is not None:
+                file.close()
+                file = None
+                temp.replace(path)
+        finally:
+            if file is not None:
+                file.close()
+            temp.unlink(missing_ok=True)
+        return None
+
+    def iter_snapshot_text(self, chunk_size: int = 1 << 16) -> Iterator[str]:
+        """ Read favorites, then emojis without favorites in chunks. """
+
+        favorites: list[str] = list(dict.fromkeys(self.load_favorites_list()))
+        if favorites:
+            yield ''.join(line + '\n' for line in favorites)
+        seen: set[str] = set(favorites)
+        rows: CherryIndex | CherryDatabase | None = self.open_rows()
+        if not rows or not len(rows):
+            return
+        for data in rows.iter_chunks(chunk_size):
+            text: str = str(data, 'utf-8')
+            if seen:
+                text = ''.join(line + '\n' for line in text.splitlines()
+                               if line not in seen)
+            yield text
+
+    def open_index(self) -> 'CherryIndex | None':
+        """ Open the binary emoji index from cache, if it is enabled.
+
+        Without emojis.json and index in the cache, the bundled index is
+        opened, if it was built with the same options.
+        """
+
+        if self.noemojis or self.db_index is None:
+            return None
+        path: Path = self.db_index
+        if (self.db_bundle
+                and not self.db_index.exists()
+                and not self.db_source.exists()):
+            path = self.db_bundle
+        if self.index is None and path.exists():
+            key: tuple | None = self.stat_key(path)
+            cached: tuple | None = None
+            if self.memo is not None:
+                cached = self.memo.get('index')
+            if cached and cached[0] == key:
+                self.index = cached[1]
+                return self.index
+            try:
+                self.index = CherryIndex(path)
+            except ValueError:
+                self.index = None
+            flags: int = (CherryIndex.FLAG_IGNORE_SKIN if self.ignore_skin
+                          else 0)
+            if (self.index
+                    and path == self.db_bundle
+                    and self.index.flags != flags):
+                self.index.close()
+                self.index = None
+            if self.memo is not None:
+                self.memo['index'] = (key, self.index)
+        return self.index
+
+    def bundle_in_use(self) -> bool:
+        """ Check if the bundled index is used instead of the cache. """
+
+        index: CherryIndex | None = self.open_index()
+        return bool(index and self.db_bundle and index.path == self.db_bundle)
+
+    def open_database(self) -> 'CherryDatabase | None':
+        """ Open the SQLite database, if it is the backend, and sync it.
+
+        Emojis are copied from the binary index when it was rebuilt and
+        favorites when their file changed. Uses of an existing recents file
+        are imported once.
+        """
+
+        if self.db_database is None:
+            return None
+        if self.database is None:
+            key: tuple = (self.db_database,)
+            cached: tuple | None = None
+            if self.memo is not None:
+                cached = self.memo.get('database')
+            if cached and cached[0] == key and self.db_database.exists():
+                self.database = cached[1]
+            else:
+                try:
+                    self.database = CherryDatabase(self.db_database)
+                except ValueError as error:
+                    print(error, file=sys.stderr)
+                    self.db_database = None
+                    return None
+                if self.memo is not None:
+                    self.memo['database'] = (key, self.database)
+                if self.db_recents and self.db_recents.exists():
+                    recents = Recents(self.db_recents)
+                    recents.load()
+                    self.database.import_recents(recents)
+            index: CherryIndex | None = self.open_index()
+            if index:
+                self.database.sync_index(index)
+            self.database.sync_favorites(
+                None if self.nofavorites else self.db_favorites)
+        return self.database
+
+    def open_rows(self) -> 'CherryIndex | CherryDatabase | None':
+        """ Get the database or else the binary index to read rows from. """
+
+        if self.noemojis:
+            return None
+        database: CherryDatabase | None = self.open_database()
+        if database is not None:
+            return database
+        return self.open_index()
+
+    def read_text(self, path: Path) -> str:
+        """ Read a text file, reuse memorized content if it is unchanged. """
+
+        if self.memo is None:
+            return path.read_text()
+        key: tuple = self.stat_key(path)
+        cached: tuple | None = self.memo.get(path)
+        if cached and cached[0] == key:
+            return cached[1]
+        text: str = path.read_text()
+        self.memo[path] = (key, text)
+        return text
+
+    @classmethod
+    def stat_key(cls, path: Path | None, disabled=False) -> tuple | None:
+        """ Get modification time and size of a file to detect changes. """
+
+        if disabled or path is None:
+            return None
+        try:
+            stat = path.stat()
+        except OSError:
+            return None
+        return (path, stat.st_mtime_ns, stat.st_size)
 
     def wipe_cache_files(self) -> None:
         """ Clean cache by deleting all known files in it. """
 
+        import shutil
+
         if self.db_source:
             self.db_source.unlink(missing_ok=True)
-        if self.db_filtered:
-            self.db_filtered.unlink(missing_ok=True)
+        self.db_source_meta.unlink(missing_ok=True)
+        self.refresh_marker.unlink(missing_ok=True)
+        self.db_source.with_suffix('.list').unlink(missing_ok=True)
+        self.db_source.with_suffix('.lower.list').unlink(missing_ok=True)
+        if self.db_index:
+            self.db_index.unlink(missing_ok=True)
+        if self.db_tokens:
+            self.db_tokens.unlink(missing_ok=True)
+        if self.db_database:
+            self.db_database.unlink(missing_ok=True)
+        shutil.rmtree(self.sources_dir, ignore_errors=True)
+        self.programs.cache_file.unlink(missing_ok=True)
+        self.timings_log.unlink(missing_ok=True)
+        # Plain text cache of older versions.
+        self.db_source.with_suffix('.cherry').unlink(missing_ok=True)
         if self.db_recents:
             self.db_recents.unlink(missing_ok=True)
         return None
 
-    def download_db_source(self, force=False):
-        """ Download emojis.json database source from URL to cache. """
+    def download_db_source(self, force=False) -> bool:
+        """ Download emojis.json database source from URL to cache.
+
+        An existing file is only checked for updates, if it is older than
+        option "--refresh-after". The request is conditional with ETag and
+        Last-Modified of last download, so an unchanged file is not sent
+        again. Returns True if a new file was downloaded.
+
+        With option "--source" all sources are merged into the file instead,
+        see ingest_sources().
+        """
 
         if force:
             self.db_source.unlink(missing_ok=True)
+        if self.db_source.exists() and not self.db_source_is_due():
+            return False
+        # Only one process downloads, others wait for it or use their file.
+        lock = FileLock(self.cache_lock)
+        if not lock.acquire(blocking=not self.db_source.exists()):
+            return False
+        try:
+            if self.sources:
+                return self.ingest_sources()
+            return self.fetch_db_source()
+        finally:
+            lock.release()
+
+    def fetch_db_source(self) -> bool:
+        """ Download emojis.json if it is due, while holding the lock. """
+
+        # Another process may have updated it while waiting for the lock.
+        if self.db_source.exists() and not self.db_source_is_due():
+            return False
+        return download_file(self.url, self.db_source, self.db_source_meta)
+
+    def load_db_source_meta(self) -> dict:
+        """ Read URL, ETag, Last-Modified and time of last update check. """
+
+        return load_meta(self.db_source_meta)
+
+    def db_source_is_due(self) -> bool:
+        """ Check if emojis.json is missing or its last check is too old. """
+
         if not self.db_source.exists():
-            self.cache_dir.mkdir(exist_ok=True)
-            self.db_filtered.unlink(missing_ok=True)
-            response = urllib.request.urlopen(self.url)
-            data = response.read()
-            text = data.decode('utf-8')
-            self.db_source.write_text(text)
+            return True
+        meta: dict = self.load_db_source_meta()
+        if self.sources:
+            return self.sources_are_due(meta)
+        if 'sources' in meta:
+            # It was merged from other sources, not downloaded from URL.
+            return True
+        if self.refresh_after <= 0:
+            return False
+        checked: float = meta.get('checked', self.db_source.stat().st_mtime)
+        return time.time() - checked >= self.refresh_after * 3600
 
-    def filter_db_source(self, force=False):
-        """ Convert, filter and sort cached database to a small text file. """
+    def source_files(self, source: str) -> tuple[str, str, Path]:
+        """ Get format, URL and file to parse of a source from "--source".
+
+        URL is empty for a local file. A download is kept in the sources
+        directory of the cache under a hash of the URL.
+        """
+
+        import zlib
+
+        fmt: str = ''
+        location: str = source
+        prefix, colon, rest = source.partition(':')
+        if colon and prefix in SOURCE_PARSERS:
+            fmt, location = prefix, rest
+        if '://' in location:
+            name: str = location.split('?')[0].rstrip('/').rpartition('/')[2]
+            path: Path = self.sources_dir / (
+                f'{zlib.crc32(location.encode("utf-8")):08x}-{name}')
+            return fmt or source_format(name), location, path
+        path = fullpath(location)
+        return fmt or source_format(path.name), '', path
+
+    def source_rows(self, path: Path) -> Path:
+        """ Get file of the parsed rows of a source file. """
+
+        import zlib
+
+        key: int = zlib.crc32(path.as_posix().encode('utf-8'))
+        return self.sources_dir / f'{key:08x}.rows'
+
+    @classmethod
+    def source_key(cls, fmt: str, path: Path) -> str | None:
+        """ Get format, modification time and size of a source file. """
+
+        try:
+            stat = path.stat()
+        except OSError:
+            return None
+        return f'{fmt} {stat.st_mtime_ns} {stat.st_size}'
+
+    def sources_are_due(self, meta: dict) -> bool:
+        """ Check if a source changed or its last download is too old. """
+
+        if meta.get('sources') != self.sources:
+            return True
+        inputs: dict = meta.get('inputs', {})
+        for source in self.sources:
+            fmt, url, path = self.source_files(source)
+            if url and not self.offline and self.download_is_due(path):
+                return True
+            if inputs.get(source) != self.source_key(fmt, path):
+                return True
+        return False
+
+    def download_is_due(self, path: Path) -> bool:
+        """ Check if a download of a source is missing or too old. """
+
+        if not path.exists():
+            return True
+        if self.refresh_after <= 0:
+            return False
+        checked: float = load_meta(
+            path.with_name(path.name + '.meta')).get('checked', 0)
+        return time.time() - checked >= self.refresh_after * 3600
+
+    def ingest_sources(self) -> bool:
+        """ Merge all sources of option "--source" into emojis.json.
+
+        Sources are downloaded and parsed at the same time in a thread pool.
+        Parsed rows of each source are kept in the cache, so only a changed
+        source is parsed again. Rows are merged in order of the sources and
+        an emoji found again in a later source is skipped, regardless of its
+        variation selectors. Called while holding the lock, returns True if
+        a new file was written.
+        """
+
+        import json
+        from concurrent.futures import ThreadPoolExecutor
+
+        meta: dict = self.load_db_source_meta()
+        # Another process may have merged it while waiting for the lock.
+        if self.db_source.exists() and not self.sources_are_due(meta):
+            return False
+        self.sources_dir.mkdir(parents=True, exist_ok=True)
+        with ThreadPoolExecutor(max_workers=min(len(self.sources), 8)) as pool:
+            parsed: list[tuple[str, Path] | None] = list(
+                pool.map(self.ingest_source, self.sources))
+        inputs: dict[str, str] = {source: result[0]
+                                  for source, result in zip(self.sources,
+                                                            parsed)
+                                  if result}
+        changed: bool = (not self.db_source.exists()
+                         or meta.get('sources') != self.sources
+                         or meta.get('inputs') != inputs)
+        if changed:
+            self.merge_sources([result[1] for result in parsed if result])
+        meta = {'sources': self.sources, 'inputs': inputs,
+                'checked': time.time()}
+        write_atomic(self.db_source_meta, json.dumps(meta).encode('utf-8'))
+        return changed
+
+    def ingest_source(self, source: str) -> tuple[str, Path] | None:
+        """ Download and parse a source, if it changed since last time.
+
+        Returns the key of the parsed file and the file of its rows, or None
+        for a download not available offline.
+        """
 
-        def sorted_by_order(elem):
-            """ Used to determined sort key by 'order' for sorted(). """
+        import json
 
-            return elem['order']
+        fmt, url, path = self.source_files(source)
+        if url and not self.offline and self.download_is_due(path):
+            download_file(url, path, path.with_name(path.name + '.meta'))
+        key: str | None = self.source_key(fmt, path)
+        if key is None:
+            if url:
+                return None
+            raise FileNotFoundError(f'Source not found: {source}')
+        rows: Path = self.source_rows(path)
+        header: str = f'#rows {key}\n'
+        try:
+            with open(rows, encoding='utf-8') as file:
+                if file.readline() == header:
+                    return key, rows
+        except OSError:
+            pass
+        temp: Path = temp_path(rows)
+        try:
+            with open(temp, 'w', encoding='utf-8') as file:
+                file.write(header)
+                for record in SOURCE_PARSERS[fmt](path):
+                    file.write(json.dumps([record['emoji'],
+                                           record['name'],
+                                           record['category'],
+                                           record['shortname']],
+                                          ensure_ascii=False) + '\n')
+            temp.replace(rows)
+        finally:
+            temp.unlink(missing_ok=True)
+        return key, rows
+
+    def merge_sources(self, files: list[Path]) -> None:
+        """ Write emojis.json from parsed rows without duplicate emojis. """
+
+        import json
+
+        seen: set[str] = set()
+        order: int = 0
+        temp: Path = temp_path(self.db_source)
+        try:
+            with open(temp, 'w', encoding='utf-8') as file:
+                file.write('{"emojis": [')
+                for path in files:
+                    with open(path, encoding='utf-8') as rows:
+                        rows.readline()
+                        for line in rows:
+                            emoji, name, category, shortname = json.loads(line)
+                            key: str = emoji.replace('\ufe0f', '')
+                            if key in seen:
+                                continue
+                            seen.add(key)
+                            order += 1
+                            record: dict = {'emoji': emoji,
+                                            'name': name,
+                                            'category': category,
+                                            'shortname': shortname,
+                                            'order': order}
+                            file.write((',\n' if order > 1 else '\n')
+                                       + json.dumps(record,
+                                                    ensure_ascii=False))
+                file.write('\n]}\n')
+            temp.replace(self.db_source)
+        finally:
+            temp.unlink(missing_ok=True)
+        return None
+
+    def start_refresh(self, timeout: float = 600) -> bool:
+        """ Start a detached process to download and rebuild the cache.
+
+        The process runs this program with menu "none" and no outputs, so it
+        updates the files in the foreground way. Each file is replaced by a
+        rename, so a running menu keeps its old copy and the next run picks
+        up the new one. A marker file prevents to start another process,
+        until the process removes it or it is older than timeout seconds.
+        Returns True if a process was started.
+        """
+
+        import subprocess
+
+        try:
+            if time.time() - self.refresh_marker.stat().st_mtime < timeout:
+                return False
+        except FileNotFoundError:
+            pass
+        command: list[str] = [sys.executable]
+        if not self.frozen:
+            command.append(Path(__file__).as_posix())
+        command.extend(['--menu', 'none',
+                        '--cache-dir', self.cache_dir.as_posix(),
+                        '--url', self.url,
+                        *[arg for source in self.sources
+                          for arg in ('--source', source)],
+                        '--refresh-after', str(self.refresh_after),
+                        '--ignore-skin' if self.ignore_skin
+                        else '--no-ignore-skin',
+                        '--nobundle',
+                        '-OCTNRF'])
+        if self.offline:
+            command.append('--offline')
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            self.refresh_marker.touch()
+            subprocess.Popen(command,
+                             stdin=subprocess.DEVNULL,
+                             stdout=subprocess.DEVNULL,
+                             stderr=subprocess.DEVNULL,
+                             start_new_session=True)
+        except OSError:
+            return False
+        return True
+
+    def filter_db_source(self, force=False):
+        """ Convert, filter and sort cached database to a binary index. """
 
+        if self.db_index is None:
+            return None
+        flags: int = CherryIndex.FLAG_IGNORE_SKIN if self.ignore_skin else 0
         if force:
-            self.db_filtered.unlink(missing_ok=True)
-        if self.db_filtered and not self.db_filtered.exists():
-            source = json.loads(self.db_source.read_text())
-            filtered: str = ''
-            emojis_face: str = ''
-            emojis_finger: str = ''
-            emojis_other: str = ''
-            for emoji in sorted(source['emojis'], key=sorted_by_order):
-
-                # Exclude emojis that have "skin" in their names, as they are
-                # mostly color variations of the main emoji.
-                not_ignored_by_skin = 'skin' not in emoji['name'] \
-                    and 'skin_tone' not in emoji['shortname'] if self.ignore_skin \
-                        else True
-                if (not_ignored_by_skin and emoji['name']):
-
-                    # Format:
-                    # ☺️ smiling face Smileys & Emotion (face-affection)
-                    str_emoji: str = (emoji['emoji'].strip()
-                                      + ' '
-                                      + emoji['name'].strip()
-                                      + ' ~ '
-                                      + emoji['category'].strip())
-
-                    # Create multiple lists with emojis, so later it can be put
-                    # together for sorted groups.
-                    if ('face' in emoji['name']
-                            or 'face' in emoji['category']):
-                        emojis_face += str_emoji + '\n'
-                    elif 'finger' in emoji['category']:
-                        emojis_finger += str_emoji + '\n'
-                    else:
-                        emojis_other += str_emoji + '\n'
+            self.db_index.unlink(missing_ok=True)
+        index: CherryIndex | None = self.open_index()
+        if index and index.is_current(self.db_source, flags):
+            if not self.open_tokens():
+                self.build_tokens()
+            return None
+        if index and self.refresh_background and not force:
+            # Serve the old index, while a new one is built in background.
+            self.start_refresh()
+            return None
+        # Only one process builds, others wait for it or use their index.
+        lock = FileLock(self.cache_lock)
+        if not lock.acquire(blocking=index is None):
+            return None
+        try:
+            self.close_index()
+            # Another process may have built it while waiting for the lock.
+            index = self.open_index()
+            if index and index.is_current(self.db_source, flags):
+                if not self.open_tokens():
+                    self.build_tokens()
+            elif self.db_source.exists():
+                self.close_index()
+                self.build_index(flags)
+        finally:
+            lock.release()
+        return None
+
+    def close_index(self) -> None:
+        """ Unmap the binary index, so it is opened again on next use.
+
+        An index shared by a memo may still be read by other requests, like
+        in the daemon, so it is only dropped here and unmapped when the last
+        request using it is done.
+        """
+
+        if self.index and self.memo is None:
+            self.index.close()
+        self.index = None
+        if self.memo is not None:
+            self.memo.pop('index', None)
+        return None
+
+    def build_index(self, flags: int) -> None:
+        """ Write binary index and token index from emojis.json. """
+
+        # Groups of rows to put together in this order.
+        group_face: int = 0
+        group_finger: int = 1
+        group_other: int = 2
+        sorter = RunSorter(3)
+        # Shortcodes of skin tones still expand, without a row in the menu.
+        skin_codes: list[tuple[str, str]] = []
+        for emoji in iter_json_records(self.db_source, 'emojis'):
+
+            # Exclude emojis that have "skin" in their names, as they are
+            # mostly color variations of the main emoji.
+            not_ignored_by_skin = 'skin' not in emoji['name'] \
+                and 'skin_tone' not in emoji['shortname'] if self.ignore_skin \
+                    else True
+            if (not_ignored_by_skin and emoji['name']):
+
+                # Columns for the line format:
+                # ☺️ smiling face ~ Smileys & Emotion (face-affection)
+                row: tuple = (emoji['emoji'].strip(),
+                              emoji['name'].strip(),
+                              emoji['category'].strip(),
+                              emoji['shortname'].strip())
+
+                # Create multiple groups of emojis, so later it can be put
+                # together sorted by their 'order'.
+                if ('face' in emoji['name']
+                        or 'face' in emoji['category']):
+                    sorter.add(group_face, emoji['order'], row)
+                elif 'finger' in emoji['category']:
+                    sorter.add(group_finger, emoji['order'], row)
+                else:
+                    sorter.add(group_other, emoji['order'], row)
+            elif emoji['name']:
+                skin_codes.append((emoji['shortname'].strip(),
+                                   emoji['emoji'].strip()))
+
+        CherryIndex.write(self.db_index, sorter, self.db_source, flags,
+                          skin_codes)
+        self.build_tokens()
+        return None
+
+    def build_tokens(self) -> None:
+        """ Create the token index for the current binary index. """
 
-            filtered = emojis_face + emojis_finger + emojis_other
-            self.db_filtered.write_text(filtered.strip('\n'))
+        self.tokens = None
+        if self.memo is not None:
+            self.memo.pop('tokens', None)
+        index: CherryIndex | None = self.open_index()
+        if index and self.db_tokens:
+            self.db_tokens.parent.mkdir(parents=True, exist_ok=True)
+            TokenIndex.write(self.db_tokens, index)
+        return None
+
+    def open_tokens(self) -> 'TokenIndex | None':
+        """ Open token index from cache, if it matches the binary index.
+
+        The bundled token index is used along with the bundled index, until
+        one is built in the cache.
+        """
+
+        index: CherryIndex | None = self.open_index()
+        if index is None or self.db_tokens is None:
+            return None
+        path: Path = self.db_tokens
+        if (self.db_bundle
+                and index.path == self.db_bundle
+                and not path.exists()):
+            path = self.db_bundle.with_suffix('.tok')
+        if self.tokens is None and path.exists():
+            key: tuple | None = self.stat_key(path)
+            cached: tuple | None = None
+            if self.memo is not None:
+                cached = self.memo.get('tokens')
+            if cached and cached[0] == key:
+                self.tokens = cached[1]
+            else:
+                try:
+                    self.tokens = TokenIndex(path)
+                except ValueError:
+                    self.tokens = None
+                if self.memo is not None:
+                    self.memo['tokens'] = (key, self.tokens)
+        if self.tokens and not self.tokens.matches(index):
+            self.tokens = None
+        return self.tokens
 
-    def update_selected_emoji(self, emoji: list | None) -> str | None:
+    def update_selected_emoji(self, emoji: list | None,
+                              record=True) -> str | None:
         """ Update last selected emoji and return by stripping newlines. """
 
-        if emoji is None:
+        return self.update_selected_emojis([] if emoji is None else [emoji],
+                                           record)
+
+    def update_selected_emojis(self, emojis: list,
+                               record=True) -> str | None:
+        """ Update last selected emoji with all emojis joined in order.
+
+        The description of a single emoji is kept, of more they are joined
+        by commas. All entries are added to recents at once, unless record
+        is off.
+        """
+
+        try:
+            pairs: list[tuple[str, str]] = [
+                (emoji[0].strip('\n'), emoji[1].strip('\n'))
+                for emoji in emojis]
+        except (ValueError, AttributeError, IndexError, TypeError):
+            pairs = []
+        if pairs:
+            self.selected_emoji = ''.join(emoji for emoji, _ in pairs)
+            self.selected_desc = ', '.join(desc for _, desc in pairs)
+            self.selected_lines = [f'{emoji} {desc}' for emoji, desc in pairs
+                                   if emoji and desc]
+            if record:
+                self.append_recents()
+        else:
             self.selected_emoji = None
             self.selected_desc = None
-        else:
-            try:
-                emoji = [emoji[0].strip('\n'), emoji[1].strip('\n')]
-                self.selected_emoji = emoji[0]
-                self.selected_desc = emoji[1]
-                self.append_recents()
-            except (ValueError, AttributeError, IndexError):
-                self.selected_emoji = None
-                self.selected_desc = None
+            self.selected_lines = []
         return self.selected_emoji
 
     def select_by_none(self):
@@ -209,38 +1010,383 @@ class App:
         return self.update_selected_emoji(None)
 
     def select_by_random(self):
-        """ Selects an emoji by random chance. """
+        """ Selects emojis by random chance, joined if more than one.
+
+        Seeded draws are not added to recents, as recents are part of the
+        drawn lists and the next draw would differ.
+        """
+
+        lines: list[str] = self.draw_random(self.count, self.unique,
+                                            self.random_weight, self.seed)
+        return self.update_selected_emojis([line.split(' ', 1)
+                                            for line in lines],
+                                           record=self.seed is None)
+
+    def draw_random(self,
+                    count: int = 1,
+                    unique=False,
+                    weight: float = 1.0,
+                    seed: int | None = None) -> list[str]:
+        """ Draw random entries by row number, without loading all rows.
 
-        random_set: set = set(self.load_emoji_list(aslist=True))
-        random_set.discard('')
-        random_list: list = list(random_set)
-        random.shuffle(random_list)
-        emoji = random_list[0].split(' ', 1)
-        return self.update_selected_emoji(emoji)
+        Recents and favorites have weight times the chance of other emojis.
+        Rows are drawn again, if they are a dupe of recents or favorites,
+        so each unique line has its own chance, or if unique draws are
+        asked and the line was drawn already. With the same seed, the same
+        lines are drawn from the same lists.
+        """
+
+        import random
+
+        rng = random.Random(seed)
+        user_list: list[str] = self.load_user_list()
+        user_set: set[str] = set(user_list)
+        index: CherryIndex | CherryDatabase | None = self.open_rows()
+        index_size: int = len(index) if index else 0
+        weight = max(weight, 0.0)
+        user_weight: float = weight * len(user_list)
+        total: float = user_weight + index_size
+        if total <= 0:
+            return []
+        if unique:
+            count = min(count, len(user_list) + index_size)
+        lines: list[str] = []
+        drawn: set[str] = set()
+        # Stop drawing dupes at some point, if most rows are dupes.
+        attempts: int = 100 * count + 1000
+        while len(lines) < count and attempts:
+            attempts -= 1
+            position: float = rng.random() * total
+            line: str
+            if position < user_weight:
+                line = user_list[min(int(position / weight),
+                                     len(user_list) - 1)]
+            elif index:
+                row: int = min(int(position - user_weight), index_size - 1)
+                line = index.line(row)
+                if line in user_set:
+                    continue
+            else:
+                continue
+            if unique:
+                if line in drawn:
+                    continue
+                drawn.add(line)
+            lines.append(line)
+        return lines
 
     def select_by_filter(self) -> str | None:
-        """ Select an emoji without a menu but first match on a filter. """
+        """ Select an emoji without a menu but best match on a filter. """
 
-        emoji_list: str | list = self.load_emoji_list(aslist=True)
-        if self.ignore_case:
-            emoji_list = list(filter(
-                lambda line: self.pattern.lower() in line.lower(),
-                emoji_list
-            ))
-        else:
-            emoji_list = list(filter(
-                lambda line: self.pattern in line,
-                emoji_list
-            ))
+        if len(self.patterns) > 1:
+            return self.select_each_pattern(self.search)
+        matches: list[str] = self.search(self.pattern, self.limit)
+        if self.limit > 1:
+            self.matches = matches
+        try:
+            emoji = matches[0].split(' ', 1)
+        except (ValueError, AttributeError, IndexError):
+            emoji = None
+        # Listed matches are not a use, so recents are not changed.
+        return self.update_selected_emoji(emoji, record=self.limit <= 1)
+
+    def search(self, pattern: str, limit: int = 1) -> list[str]:
+        """ Get best matching entries for a pattern, ranked by relevance.
+
+        All words of the pattern must match the start of a word in the
+        entry. Entries are ranked by number of exact word matches, then word
+        prefix matches, then if the emoji is a favorite or recently used.
+        Without any match the first entries containing the pattern as plain
+        text are used instead.
+        """
+
+        words: list[str] = tokenize(pattern)
+        user_list: list[str] = self.load_user_list()
+        favorites: set[str] = set()
+        if (not self.nofavorites
+                and self.db_favorites
+                and self.db_favorites.exists()):
+            favorites = {line.split(' ', 1)[0] for line in
+                         self.read_text(self.db_favorites).splitlines()}
+        recents: set[str] = ({line.split(' ', 1)[0] for line in user_list}
+                             - favorites)
+        # Entries of sort key, line of user list or row of binary index.
+        ranked: list[tuple] = []
+        index: CherryIndex | CherryDatabase | None = self.open_rows()
+        if words:
+            for position, line in enumerate(user_list):
+                score: tuple | None = rank_words(words, tokenize(line))
+                if score:
+                    emoji: str = line.split(' ', 1)[0]
+                    name: str = line.partition(' ')[2].partition(' ~ ')[0]
+                    ranked.append(((-score[0], -score[1],
+                                    emoji not in favorites,
+                                    emoji not in recents,
+                                    len(tokenize(name)), position),
+                                   line, None))
+            tokens: TokenIndex | None = self.open_tokens()
+            if isinstance(index, CherryDatabase):
+                for row, exact, emoji, name_size in index.search(words):
+                    ranked.append(((-exact, -(len(words) - exact),
+                                    emoji not in favorites,
+                                    emoji not in recents,
+                                    name_size, len(user_list) + row),
+                                   None, row))
+            elif tokens and index:
+                favorites_bytes: set[bytes] = {emoji.encode('utf-8')
+                                               for emoji in favorites}
+                recents_bytes: set[bytes] = {emoji.encode('utf-8')
+                                             for emoji in recents}
+                for row, score in tokens.search(words).items():
+                    emoji_bytes: bytes = index.field_bytes('emoji', row)
+                    ranked.append(((-score[0], -score[1],
+                                    emoji_bytes not in favorites_bytes,
+                                    emoji_bytes not in recents_bytes,
+                                    tokens.name_size(row),
+                                    len(user_list) + row),
+                                   None, row))
+
+        # Shorter names are more specific, if all else is equal. Lines are
+        # only read for the best entries, until enough are found.
+        ranked.sort(key=operator.itemgetter(0))
+        matches: list[str] = []
+        for _, line, row in ranked:
+            if line is None and index:
+                line = index.line(row)
+            if line not in matches and self.has_words(line, pattern):
+                matches.append(line)
+                if len(matches) >= limit:
+                    break
+        if not matches:
+            matches = self.search_text(pattern, limit)
+        return matches
+
+    def select_by_fuzzy(self) -> str | None:
+        """ Select an emoji without a menu but best fuzzy match. """
+
+        if len(self.patterns) > 1:
+            return self.select_each_pattern(self.fuzzy_search)
+        matches: list[str] = self.fuzzy_search(self.pattern, self.limit)
+        if self.limit > 1:
+            self.matches = matches
         try:
-            emoji = emoji_list[0].split(' ', 1)
+            emoji = matches[0].split(' ', 1)
         except (ValueError, AttributeError, IndexError):
             emoji = None
-        return self.update_selected_emoji(emoji)
+        # Listed matches are not a use, so recents are not changed.
+        return self.update_selected_emoji(emoji, record=self.limit <= 1)
+
+    def select_each_pattern(self,
+                            search: Callable[[str, int], list[str]]
+                            ) -> str | None:
+        """ Select best match of each pattern, skip patterns without one. """
+
+        emojis: list[list[str]] = []
+        for pattern in self.patterns:
+            matches: list[str] = search(pattern, 1)
+            if matches and ' ' in matches[0]:
+                emojis.append(matches[0].split(' ', 1))
+        return self.update_selected_emojis(emojis)
+
+    def fuzzy_search(self, pattern: str, limit: int = 1) -> list[str]:
+        """ Get best entries matching characters of pattern in order.
+
+        Like "fzf", case is ignored unless the pattern has uppercase letters
+        or option "--ignore-case" is set. A single regular expression over
+        all entries finds the candidates and the end of their first match,
+        so only that part of each candidate is scored. Entries are ranked by
+        score, then by length and position. Lines are only extracted for the
+        best entries.
+        """
+
+        pattern = ''.join(pattern.split())
+        ignore_case: bool = self.ignore_case or pattern == pattern.lower()
+        if ignore_case:
+            pattern = pattern.lower()
+        user_list: list[str] = self.load_user_list()
+        user_text: str = '\n'.join(user_list) + '\n' if user_list else ''
+        index: CherryIndex | None = self.open_index()
+        text: str = user_text
+        if index and len(index):
+            text += index.lines_text()
+        if not pattern:
+            return (user_list + text[len(user_text):].splitlines())[0:limit]
+        # Searching a lowercase copy is much faster than ignoring case in
+        # the expression, unless lowercase changes the length of the text.
+        folded: str | None = text.lower() if ignore_case else None
+        haystack: str = text
+        if folded is not None and len(folded) == len(text):
+            haystack = folded
+        else:
+            folded = None
+        regex = fuzzy_regex(pattern, ignore_case and folded is None)
+        # Same search on reversed text finds the shortest window of a match.
+        reverse_regex = fuzzy_regex(pattern[::-1],
+                                    ignore_case and folded is None)
+        reverse_text: str = haystack[::-1]
+        # Entries of optimistic sort key and range of match and line. The
+        # key uses the highest possible score with the known start and gaps.
+        candidates: list[tuple] = []
+        position: int = 0
+        while match := regex.search(haystack, position):
+            start: int = text.rfind('\n', 0, match.start()) + 1
+            end: int = text.find('\n', match.end())
+            if end < 0:
+                end = len(text)
+            reverse_match = reverse_regex.search(reverse_text,
+                                                 len(text) - match.end())
+            window_start: int = len(text) - reverse_match.end()
+            gaps: int = match.end() - window_start - len(pattern)
+            best: int = (FUZZY_SCORE_MATCH * len(pattern)
+                         + fuzzy_bonus(text, window_start)
+                         * FUZZY_BONUS_FIRST_MULTIPLIER
+                         + FUZZY_BONUS_BOUNDARY * (len(pattern) - 1))
+            if gaps:
+                best += FUZZY_GAP_START + FUZZY_GAP_EXTENSION * (gaps - 1)
+            candidates.append(((-best, end - start, start),
+                               window_start, match.end(), end))
+            position = end + 1
+        candidates.sort(key=operator.itemgetter(0))
+
+        # Score candidates in order, until the optimistic key of the next
+        # candidate can not beat any of the best entries found.
+        seen: set[str] = set(user_list)
+        ranked: list[tuple[int, int, int]] = []
+        lines: dict[int, str] = {}
+        for key, window_start, window_end, end in candidates:
+            if len(ranked) >= limit and key > max(ranked):
+                break
+            start = key[2]
+            line: str = text[start:end]
+            # Skip entries of the emoji index, which are in the user list.
+            if start >= len(user_text) and line in seen:
+                continue
+            score: int | None = fuzzy_score(pattern, text, ignore_case,
+                                            window_start, window_end, folded)
+            if score is not None:
+                lines[start] = line
+                ranked.append((-score, end - start, start))
+                if len(ranked) > limit:
+                    ranked.remove(max(ranked))
+        return [lines[entry[2]] for entry in sorted(ranked)]
+
+    def lookup_shortcode(self, code: bytes) -> bytes | None:
+        """ Get emoji of a shortcode of the binary index, both UTF-8. """
+
+        index: CherryIndex | None = self.open_index()
+        if self.noemojis or index is None:
+            return None
+        return index.shortcode(code)
+
+    def has_words(self, line: str, pattern: str) -> bool:
+        """ Check case sensitive words, unless case is ignored. """
+
+        if self.ignore_case:
+            return True
+        return all(word in line for word in pattern.split())
+
+    def search_text(self, pattern: str, limit: int = 1) -> list[str]:
+        """ Get first entries containing pattern as plain text. """
+
+        matches: list[str] = []
+        if self.ignore_case:
+            pattern_lower: str = pattern.lower()
+            matches = [line for line in self.load_user_list()
+                       if pattern_lower in line.lower()][0:limit]
+        else:
+            matches = [line for line in self.load_user_list()
+                       if pattern in line][0:limit]
+        index: CherryIndex | None = self.open_index()
+        if index and len(matches) < limit:
+            for row in index.find_all(pattern, self.ignore_case):
+                line = index.line(row)
+                if line not in matches:
+                    matches.append(line)
+                if len(matches) >= limit:
+                    break
+        return matches
+
+    def select_by_curses(self):
+        """ Select an emoji with the built-in terminal menu. """
+
+        import subprocess
+
+        entries: list[str]
+        if self.memo is None:
+            with self.timings.phase('load'):
+                entries = ''.join(self.iter_snapshot_list()).splitlines()
+        else:
+            # The daemon holds the lists in memory already.
+            entries = self.load_emoji_list(aslist=True)
+        try:
+            lines: list[str] = pick_lines(entries, self.prompt,
+                                          self.list_size, self.multi,
+                                          self.ignore_case, self.pattern)
+        except OSError:
+            raise subprocess.SubprocessError
+        return self.update_selected_emojis([line.split(' ', 1)
+                                            for line in lines if ' ' in line])
 
     def select_by_dmenu(self):
         """ Select an emoji with dmenu and get emoji and desc tuple. """
 
+        command, emoji_list = self.menu_request('dmenu')
+        emojis = App.select_command_emojis(command, emoji_list)
+        return self.update_selected_emojis(emojis)
+
+    def select_by_rofi(self):
+        """ Select an emoji with rofi and get emoji and desc tuple. """
+
+        command, emoji_list = self.menu_request('rofi')
+        emojis = App.select_command_emojis(command, emoji_list)
+        return self.update_selected_emojis(emojis)
+
+    def select_by_pmenu(self):
+        """ Select an emoji with pmenu and get emoji and desc tuple. """
+
+        command, emoji_list = self.menu_request('pmenu')
+        emojis = App.select_command_emojis(command, emoji_list)
+        return self.update_selected_emojis(emojis)
+
+    def select_by_fzf(self):
+        """ Select an emoji with fzf and get emoji and desc tuple. """
+
+        command, emoji_list = self.menu_request('fzf')
+        emojis = App.select_command_emojis(command, emoji_list)
+        if self.pattern:
+            # Option "--filter" lists all matches, the first is the best.
+            emojis = emojis[0:1]
+        return self.update_selected_emojis(emojis)
+
+    def menu_request(self, menu: str) -> tuple[list[str], Iterator[str]]:
+        """ Get command and input list chunks to run a menu program with. """
+
+        command: list[str]
+        if menu == 'dmenu':
+            command = self.dmenu_command()
+        elif menu == 'rofi':
+            command = self.rofi_command()
+        elif menu == 'pmenu':
+            command = self.pmenu_command()
+        elif menu == 'fzf':
+            command = self.fzf_command()
+        else:
+            raise RuntimeError('Unkown menu option.')
+        lower: bool = self.ignore_case and menu in ('dmenu', 'pmenu')
+        chunks: Iterator[str]
+        if self.memo is None:
+            chunks = self.iter_snapshot_list(lower)
+        else:
+            # The daemon holds the lists in memory already.
+            chunks = self.iter_emoji_list()
+            if lower:
+                chunks = map(str.lower, chunks)
+        emoji_list: Iterator[str] = self.timings.iterate('load', chunks)
+        return command, emoji_list
+
+    def dmenu_command(self) -> list[str]:
+        """ Build commandline to run dmenu with. """
+
         command: list[str] = []
         command.append(self.programs['dmenu'].as_posix())
         command.append('-p')
@@ -249,14 +1395,10 @@ class App:
         command.append(str(self.list_size))
         command.append('-fn')
         command.append(f'"{self.font_family}-{str(self.font_size)}"')
-        emoji_list = self.load_emoji_list()
-        if self.ignore_case:
-            emoji_list = emoji_list.lower()
-        emoji = App.select_command_emoji(command, emoji_list)
-        return self.update_selected_emoji(emoji)
+        return command
 
-    def select_by_rofi(self):
-        """ Select an emoji with rofi and get emoji and desc tuple. """
+    def rofi_command(self) -> list[str]:
+        """ Build commandline to run rofi with. """
 
         command: list[str] = []
         command.append(self.programs['rofi'].as_posix())
@@ -271,30 +1413,26 @@ class App:
         command.append('-font')
         command.append(f'"{self.font_family} {str(self.font_size)}"')
         command.append('-no-custom')
+        if self.multi:
+            command.append('-multi-select')
         command.append('-matching')
         command.append(self.matching_rofi)
         if self.ignore_case:
             command.append('-i')
             command.append('-nocase-sensitive')
-        emoji_list = self.load_emoji_list()
-        emoji = App.select_command_emoji(command, emoji_list)
-        return self.update_selected_emoji(emoji)
+        return command
 
-    def select_by_pmenu(self):
-        """ Select an emoji with pmenu and get emoji and desc tuple. """
+    def pmenu_command(self) -> list[str]:
+        """ Build commandline to run pmenu with. """
 
         command: list[str] = []
         command.append(self.programs['pmenu'].as_posix())
         command.append('-p')
         command.append(self.prompt)
-        emoji_list = self.load_emoji_list()
-        if self.ignore_case:
-            emoji_list = emoji_list.lower()
-        emoji = App.select_command_emoji(command, emoji_list)
-        return self.update_selected_emoji(emoji)
+        return command
 
-    def select_by_fzf(self):
-        """ Select an emoji with fzf and get emoji and desc tuple. """
+    def fzf_command(self) -> list[str]:
+        """ Build commandline to run fzf with. """
 
         command: list[str] = []
         command.append(self.programs['fzf'].as_posix())
@@ -305,35 +1443,68 @@ class App:
         if self.pattern:
             command.append('--filter')
             command.append(self.pattern)
+        elif self.multi:
+            command.append('--multi')
         if self.ignore_case:
             command.append('-i')
-        emoji_list = self.load_emoji_list()
-        emoji = App.select_command_emoji(command, emoji_list)
-        return self.update_selected_emoji(emoji)
+        return command
 
     @classmethod
-    def select_command_emoji(
+    def select_command_emojis(
             cls,
             command,
-            emoji_list) -> Tuple[str, str] | Tuple[None, None]:
-        """ Return selected emoji and desc from list using custom command. """
+            emoji_list: str | Iterable[str]
+    ) -> list[tuple[str, str]]:
+        """ Return emoji and desc of each line selected with custom command.
+
+        The command is started first and the list is written to it in
+        chunks from another thread, while its output is read. Menus with
+        multi-select output one line per selected entry.
+        """
+
+        import subprocess
+        import threading
+
+        def feed(process: subprocess.Popen) -> None:
+            """ Write all chunks of the list to stdin of the process. """
+
+            try:
+                for chunk in chunks:
+                    process.stdin.write(chunk.encode('utf-8'))
+            except (BrokenPipeError, ValueError):
+                # Menu was closed before the list was complete.
+                pass
+            finally:
+                try:
+                    process.stdin.close()
+                except BrokenPipeError:
+                    pass
 
-        output_p: CompletedProcess | None = None
+        chunks: Iterable[str]
+        if isinstance(emoji_list, str):
+            chunks = [emoji_list]
+        else:
+            chunks = emoji_list
         try:
-            output_p = subprocess.run(command,
-                                      input=emoji_list,
-                                      stdout=subprocess.PIPE,
-                                      text=True)
+            process = subprocess.Popen(command,
+                                       stdin=subprocess.PIPE,
+                                       stdout=subprocess.PIPE)
         except FileNotFoundError:
             raise subprocess.SubprocessError
-        if output_p and output_p.stdout:
+        feeder = threading.Thread(target=feed, args=(process,), daemon=True)
+        feeder.start()
+        stdout: str = process.stdout.read().decode('utf-8', errors='replace')
+        process.stdout.close()
+        process.wait()
+        feeder.join()
+        emojis: list[tuple[str, str]] = []
+        for line in stdout.splitlines():
             try:
-                emoji, desc = output_p.stdout.split(' ', 1)
-                return emoji.strip(' \n'), desc.strip(' \n')
+                emoji, desc = line.split(' ', 1)
             except ValueError:
-                return None, None
-        else:
-            return None, None
+                continue
+            emojis.append((emoji.strip(' \n'), desc.strip(' \n')))
+        return emojis
 
     def send_emoji_to_stdout(self, newline=True) -> None:
         """ Print out emoji to stdout. """
@@ -343,9 +1514,13 @@ class App:
         else:
             print(self.selected_emoji, end='')
 
-    def send_emoji_to_clipboard(self) -> subprocess.Popen | None:
+    def send_emoji_to_clipboard(self,
+                                timeout: float = 2.0
+                                ) -> subprocess.Popen | None:
         """ Copy emoji to systems clipboard. """
 
+        import subprocess
+
         command: list[str] = []
         command.append(self.programs['xclip'].as_posix())
         command.append('-rmlastnl')
@@ -357,7 +1532,8 @@ class App:
                                    text=True)
         if xclip_p:
             try:
-                xclip_p.communicate(input=(self.selected_emoji), timeout=2)
+                xclip_p.communicate(input=(self.selected_emoji),
+                                    timeout=timeout)
                 if xclip_p.returncode:
                     raise subprocess.SubprocessError
             except subprocess.TimeoutExpired:
@@ -369,9 +1545,13 @@ class App:
             raise subprocess.SubprocessError
         return xclip_p
 
-    def send_emoji_to_typing(self) -> CompletedProcess | None:
+    def send_emoji_to_typing(self,
+                             timeout: float = 1.0
+                             ) -> subprocess.CompletedProcess | None:
         """ Output emoji to active window as if user typed it on keyboard. """
 
+        import subprocess
+
         command: list[str] = []
         command.append(self.programs['xdotool'].as_posix())
         command.append('getwindowfocus')
@@ -383,96 +1563,1978 @@ class App:
         command.append('25')
         if self.selected_emoji:
             command.append(self.selected_emoji)
-        xdotool_p: CompletedProcess | None = None
+        xdotool_p: subprocess.CompletedProcess | None = None
         xdotool_p = subprocess.run(command,
                                    stdin=subprocess.PIPE,
                                    text=True,
                                    check=True,
-                                   timeout=1)
+                                   timeout=timeout)
         return xdotool_p
 
-    def send_emoji_to_notify(self) -> CompletedProcess | None:
-        """ Send the emoji as a notification message. """
+    def send_emoji_to_notify(self,
+                             timeout: float = 1.0
+                             ) -> subprocess.CompletedProcess | None:
+        """ Send the emoji as a notification message. """
+
+        import subprocess
+
+        command: list[str] = []
+        command.append(self.programs['notify-send'].as_posix())
+        command.append('--urgency=low')
+        if self.selected_emoji:
+            command.append(self.selected_emoji)
+        notify_p: subprocess.CompletedProcess | None = None
+        notify_p = subprocess.run(command,
+                                  stdin=subprocess.PIPE,
+                                  text=True,
+                                  check=True,
+                                  timeout=timeout)
+        return notify_p
+
+    def append_recents(self) -> bool:
+        """ Append the last selected emoji entries to the recents file. """
+
+        if (not self.norecents
+                and self.db_recents
+                and self.selected_lines):
+            database: CherryDatabase | None = self.open_database()
+            if database is not None:
+                database.use(self.selected_lines)
+            else:
+                Recents(self.db_recents).add(self.selected_lines)
+            return True
+        else:
+            return False
+
+    def report_timings(self) -> None:
+        """ Print timings of this run and add them to the rolling log. """
+
+        # Stop the clock first, so reporting is not part of the total.
+        self.timings.add('total', self.timings.elapsed())
+        if not self.print_timings and not self.log_timings:
+            return None
+
+        import json
+
+        data: str = json.dumps(self.timings.phases)
+        if self.print_timings:
+            print(data, file=sys.stderr)
+        if self.log_timings:
+            self.timings_log.parent.mkdir(parents=True, exist_ok=True)
+            lock = FileLock(self.timings_log.with_name(
+                self.timings_log.name + '.lock'))
+            with lock:
+                self.trim_timings_log()
+                with open(self.timings_log, 'a') as file:
+                    file.write(data + '\n')
+        return None
+
+    def trim_timings_log(self) -> bool:
+        """ Keep only the last runs of the timings log if it gets big. """
+
+        max_byte_size: int = 256 * 1024
+        max_list_entries: int = 1000
+        if (self.timings_log.exists()
+                and self.timings_log.stat().st_size > max_byte_size):
+            runs: list[str] = self.timings_log.read_text().splitlines()
+            runs = runs[-max_list_entries:]
+            write_atomic(self.timings_log,
+                         ('\n'.join(runs) + '\n').encode('utf-8'))
+            return True
+        else:
+            return False
+
+    def print_stats(self) -> None:
+        """ Print percentiles of each phase from the timings log. """
+
+        import json
+
+        phases: dict[str, list[float]] = {}
+        if self.timings_log.exists():
+            for line in self.timings_log.read_text().splitlines():
+                try:
+                    run: dict[str, float] = json.loads(line)
+                except ValueError:
+                    continue
+                for name, duration in run.items():
+                    phases.setdefault(name, []).append(duration)
+        if not phases:
+            print('No timings logged yet, run with option "--timings-log".')
+            return None
+        print(f'{"phase":<12} {"runs":>6} {"p50 ms":>10} {"p95 ms":>10} '
+              f'{"p99 ms":>10}')
+        for name, durations in phases.items():
+            durations.sort()
+            print(f'{name:<12} {len(durations):>6} '
+                  f'{percentile(durations, 0.50):>10.1f} '
+                  f'{percentile(durations, 0.95):>10.1f} '
+                  f'{percentile(durations, 0.99):>10.1f}')
+        return None
+
+    def print_version(self):
+        """ Print version and frozen state of this program. """
+
+        if self.frozen:
+            frozen = ' (pyinstaller)'
+        else:
+            frozen = ''
+        print(f'{self.name} v{self.version}{frozen}')
+
+    def print_list_programs(self):
+        """ Print all program names and paths to stdout. """
+
+        for name, path in self.programs.items():
+            print(name + ':', path.as_posix())
+
+    @classmethod
+    def which(cls, command: str) -> Path:
+        """ Find command in $PATH or get fullpath. """
+
+        import shutil
+
+        program: str | None = shutil.which(command)
+        path: Path
+        if program:
+            path = Path(program)
+        else:
+            path = fullpath(command)
+            if not path.is_file():
+                path = Path(command)
+        return path
+
+
+class Programs(Mapping):
+    """ Table of program names and paths, resolved on first access.
+
+    Found paths are saved to a cache file, which is only valid for the same
+    $PATH and commands. Cached paths are revalidated with a stat call instead
+    of searching all directories in $PATH again.
+    """
+
+    def __init__(self,
+                 commands: dict[str, str],
+                 cache_file: Path,
+                 timings: Timings | None = None) -> None:
+        """ Construct table of names and commands without resolving. """
+
+        import zlib
+
+        self.commands: dict[str, str] = commands
+        self.cache_file: Path = cache_file
+        self.timings: Timings | None = timings
+        self.resolved: dict[str, Path] = {}
+        self.cached: dict[str, str] | None = None
+        key_data: str = repr([os.getenv('PATH', ''), commands])
+        self.key: str = f'{zlib.crc32(key_data.encode("utf-8")):08x}'
+
+    def __getitem__(self, name: str) -> Path:
+        if name not in self.resolved:
+            if self.timings:
+                with self.timings.phase('programs'):
+                    self.resolved[name] = self.resolve(name)
+            else:
+                self.resolved[name] = self.resolve(name)
+        return self.resolved[name]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.commands)
+
+    def __len__(self) -> int:
+        return len(self.commands)
+
+    def resolve(self, name: str) -> Path:
+        """ Get path of program from cache file or search for it. """
+
+        command: str = self.commands[name]
+        cached: dict[str, str] = self.load_cache()
+        if name in cached:
+            path: Path = Path(cached[name])
+            if path.is_file():
+                return path
+        path = App.which(command)
+        if path.is_absolute() and path.is_file():
+            cached[name] = path.as_posix()
+            self.save_cache()
+        return path
+
+    def load_cache(self) -> dict[str, str]:
+        """ Read cache file, if it was made for same $PATH and commands. """
+
+        import json
+
+        if self.cached is None:
+            self.cached = {}
+            try:
+                data: dict = json.loads(self.cache_file.read_text())
+                if data.get('key') == self.key:
+                    self.cached = data['programs']
+            except (OSError, ValueError, KeyError, AttributeError):
+                pass
+        return self.cached
+
+    def save_cache(self) -> None:
+        """ Write all cached paths to the cache file. """
+
+        import json
+
+        data: str = json.dumps({'key': self.key, 'programs': self.cached})
+        try:
+            self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+            write_atomic(self.cache_file, data.encode('utf-8'))
+        except OSError:
+            pass
+
+
+class Timings:
+    """ Durations of program phases in milliseconds.
+
+    A phase is measured with "with timings.phase(name):", durations of the
+    same phase name are added up. Phases can be nested, in example the cache
+    build is part of "init".
+    """
+
+    def __init__(self) -> None:
+        """ Construct empty timings, starting the clock for elapsed(). """
+
+        self.start: float = time.perf_counter()
+        self.phases: dict[str, float] = {}
+        self.stack: list[tuple[str, float]] = []
+        self.name: str = ''
+
+    def phase(self, name: str) -> Timings:
+        """ Name the phase measured by the next "with" block. """
+
+        self.name = name
+        return self
+
+    def __enter__(self) -> Timings:
+        self.stack.append((self.name, time.perf_counter()))
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        name, start = self.stack.pop()
+        self.add(name, (time.perf_counter() - start) * 1000)
+
+    def add(self, name: str, duration: float) -> None:
+        """ Add duration in milliseconds to a phase. """
+
+        self.phases[name] = round(self.phases.get(name, 0.0) + duration, 3)
+
+    def elapsed(self) -> float:
+        """ Get milliseconds since construction. """
+
+        return (time.perf_counter() - self.start) * 1000
+
+    def iterate(self, name: str, iterable: Iterable) -> Iterator:
+        """ Pass items through and add the time to produce them to a phase.
+
+        The clock is read directly instead of using phase(), as the items
+        may be consumed from another thread while a phase is running.
+        """
+
+        iterator: Iterator = iter(iterable)
+        while True:
+            start: float = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.add(name, (time.perf_counter() - start) * 1000)
+            yield item
+
+
+class FileLock:
+    """ Exclusive lock of a file, shared by all processes.
+
+    The lock is taken on its own file, as the files it protects are replaced
+    by renames. It is used with "with lock:" to wait for it, or acquire()
+    can be asked to not wait. Locks are released by the system, if a process
+    dies.
+    """
+
+    def __init__(self, path: Path) -> None:
+        """ Construct lock of a file, without taking it. """
+
+        self.path: Path = path
+        self.fd: int | None = None
+
+    def acquire(self, blocking=True) -> bool:
+        """ Take the lock, False if not blocking and it is taken. """
+
+        import fcntl
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd: int = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if blocking
+                        else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self.fd = fd
+        return True
+
+    def release(self) -> None:
+        """ Give the lock free for other processes. """
+
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+        return None
+
+    def __enter__(self) -> FileLock:
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+
+class Recents:
+    """ Store of used entries, ranked by frecency.
+
+    Each entry has a use count, time of last use and a frecency key, which
+    is the base 2 logarithm of the sum of all uses, each decayed by
+    half_life seconds since the start of epoch. All keys decay at the same
+    rate, so the ranking by key does not change over time and is kept
+    sorted in the file.
+
+    The file starts with a header, which contains the size of the sorted
+    snapshot of entries. Each use is appended as a line to the end of it
+    and merged into the snapshot on compaction, once the appended part
+    gets big. Old plain text recents files are read as a list of uses.
+    """
+
+    magic: str = '#frecency'
+    half_life: float = 3 * 24 * 60 * 60
+    max_entries: int = 200
+    max_log_size: int = 4096
+
+    def __init__(self, path: Path, text: str | None = None,
+                 size: int | None = None) -> None:
+        """ Construct store for a file, read it from text if given. """
+
+        self.path: Path = path
+        self.entries: dict[str, list] = {}
+        if text is not None:
+            self.load(text, size)
+
+    def load(self, text: str | None = None, size: int | None = None) -> None:
+        """ Read snapshot and appended uses, from file if no text given.
+
+        With a size, only the first size entries of the snapshot and those
+        with appended uses are read. Keys only grow with uses, so no other
+        entry can get into the top size entries.
+        """
+
+        if text is None:
+            try:
+                text = self.path.read_text()
+            except FileNotFoundError:
+                text = ''
+        self.entries = {}
+        rows: list[str] = text.splitlines()
+        if size is not None and text.startswith(self.magic):
+            rows = self.top_rows(text, size)
+        legacy: list[str] = []
+        for row in rows:
+            try:
+                if row.startswith(self.magic):
+                    continue
+                elif row.startswith('+'):
+                    stamp, line = row[1:].split('\t', 1)
+                    self.use(line, float(stamp))
+                elif '\t' in row:
+                    key, count, last, line = row.split('\t', 3)
+                    self.entries[line] = [float(key), int(count), float(last)]
+                elif row:
+                    legacy.append(row)
+            except ValueError:
+                continue
+        # Lines of plain text recents files are ordered from old to new.
+        now: float = time.time()
+        for age, line in enumerate(reversed(legacy)):
+            self.use(line, now - age)
+        return None
+
+    @staticmethod
+    def top_rows(text: str, size: int) -> list[str]:
+        """ Get header, first size snapshot rows, used rows and uses. """
+
+        start: int = text.find('\n+') + 1
+        if start == 0:
+            start = len(text)
+        head: list[str] = text[0:start].split('\n', size + 1)
+        rest: str = head.pop() if len(head) > size + 1 else ''
+        uses: list[str] = text[start:].splitlines()
+        used: set[str] = {row.split('\t', 1)[-1] for row in uses}
+        if used:
+            head += [row for row in rest.splitlines()
+                     if row.split('\t', 3)[-1] in used]
+        return head + uses
+
+    def use(self, line: str, stamp: float) -> None:
+        """ Count a use of line at a time in seconds since epoch. """
+
+        entry: list | None = self.entries.get(line)
+        if entry is None:
+            self.entries[line] = [Recents.frecency(None, stamp), 1, stamp]
+        else:
+            entry[0] = Recents.frecency(entry[0], stamp)
+            entry[1] += 1
+            entry[2] = max(entry[2], stamp)
+        return None
+
+    @classmethod
+    def frecency(cls, key: float | None, stamp: float) -> float:
+        """ Get frecency key with another use added at a time. """
+
+        used: float = stamp / cls.half_life
+        if key is None:
+            return used
+        # log2(2^a + 2^b) without overflow.
+        high, low = max(key, used), min(key, used)
+        return high + math.log2(1 + 2 ** (low - high))
+
+    def top(self, size: int) -> list[str]:
+        """ Get entries with highest frecency first. """
+
+        ranked: list = sorted(self.entries.items(),
+                              key=lambda item: (-item[1][0], -item[1][2]))
+        return [line for line, _ in ranked[0:size]]
+
+    def lock(self) -> FileLock:
+        """ Get lock of the file, to not lose uses appended on compaction. """
+
+        return FileLock(self.path.with_name(self.path.name + '.lock'))
+
+    def add(self, lines: list[str], stamp: float | None = None) -> None:
+        """ Append a use of each line with one write, compact if needed. """
+
+        if stamp is None:
+            stamp = time.time()
+        with self.lock():
+            if self.needs_compaction():
+                self.load()
+                for line in lines:
+                    self.use(line, stamp)
+                self.compact()
+            else:
+                with open(self.path, 'a') as file:
+                    file.write(''.join(f'+{stamp:.0f}\t{line}\n'
+                                       for line in lines))
+        return None
+
+    def needs_compaction(self) -> bool:
+        """ Check if the appended uses got big, by reading the header. """
+
+        try:
+            with open(self.path, 'rb') as file:
+                header: bytes = file.readline(64)
+                size: int = os.fstat(file.fileno()).st_size
+        except FileNotFoundError:
+            return True
+        fields: list[bytes] = header.split()
+        if (len(fields) != 2
+                or fields[0] != self.magic.encode()
+                or not fields[1].isdigit()):
+            return True
+        return size - int(fields[1]) > self.max_log_size
+
+    def compact(self) -> None:
+        """ Write all entries as sorted snapshot, drop the least used. """
+
+        lines: list[str] = []
+        for line in self.top(self.max_entries):
+            key, count, last = self.entries[line]
+            lines.append(f'{key:.6f}\t{count}\t{last:.0f}\t{line}\n')
+        body: bytes = ''.join(lines).encode('utf-8')
+        header_size: int = len(self.magic) + 12
+        header: str = f'{self.magic} {header_size + len(body):010d}\n'
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        write_atomic(self.path, header.encode() + body)
+        return None
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    """ Get nearest-rank percentile of sorted values. """
+
+    if not values:
+        return 0.0
+    rank: int = max(1, -int(-fraction * len(values) // 1))
+    return values[min(rank, len(values)) - 1]
+
+
+class CherryIndex:
+    """ Memory-mapped binary index of the emoji database.
+
+    The file starts with a header, followed by a table with the positions of
+    each column. Each column is an offset table of 64 bit integers for all
+    rows and the UTF-8 encoded text of all rows. The column "line" is the
+    complete menu entry of each row with a newline after each, so it can be
+    used as a single block of text.
+
+    After the columns of the rows follows the shortcode table, in the same
+    layout: all unique shortcodes sorted as UTF-8 bytes with a newline after
+    each and the emoji of each. The shortcodes are split into a list at once
+    on first use and a shortcode is found by bisection, without reading the
+    rows. It also has shortcodes of rows left out of the index, like skin
+    tones.
+    """
+
+    magic: bytes = b'CHERRYIX'
+    version: int = 2
+    columns: tuple[str, ...] = ('line', 'emoji', 'name', 'category',
+                                'shortname')
+    code_columns: tuple[str, ...] = ('code', 'code_emoji')
+    # magic, version, flags, rows, source size, source mtime, source sha256,
+    # number of shortcodes
+    header: struct.Struct = struct.Struct('<8sHHQQQ32sQ')
+    # position of offset table, position of text
+    column_entry: struct.Struct = struct.Struct('<QQ')
+    FLAG_IGNORE_SKIN: int = 1
+
+    def __init__(self, path: Path) -> None:
+        """ Open index file and read its header. """
+
+        self.path: Path = path
+        with open(path, 'rb') as file:
+            try:
+                self.mmap: mmap.mmap = mmap.mmap(file.fileno(), 0,
+                                                 access=mmap.ACCESS_READ)
+            except (ValueError, OSError):
+                raise ValueError(f'Empty or unreadable index: {path}')
+        try:
+            (magic, version, self.flags, self.rows, self.source_size,
+             self.source_mtime, self.source_hash, self.codes) = (
+                CherryIndex.header.unpack_from(self.mmap))
+        except struct.error:
+            self.mmap.close()
+            raise ValueError(f'Broken index: {path}')
+        if magic != CherryIndex.magic or version != CherryIndex.version:
+            self.mmap.close()
+            raise ValueError(f'Unknown index format: {path}')
+        self.view: memoryview = memoryview(self.mmap)
+        self.offsets: dict[str, memoryview] = {}
+        self.data_pos: dict[str, int] = {}
+        self.code_list: list[bytes] | None = None
+        pos: int = CherryIndex.header.size
+        for column in CherryIndex.columns + CherryIndex.code_columns:
+            offsets_pos, data_pos = CherryIndex.column_entry.unpack_from(
+                self.mmap, pos)
+            pos += CherryIndex.column_entry.size
+            count: int = (self.codes if column in CherryIndex.code_columns
+                          else self.rows)
+            end: int = offsets_pos + 8 * (count + 1)
+            self.offsets[column] = self.view[offsets_pos:end].cast('Q')
+            self.data_pos[column] = data_pos
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def close(self) -> None:
+        """ Release all views and unmap the file. """
+
+        for offsets in self.offsets.values():
+            offsets.release()
+        self.offsets = {}
+        self.view.release()
+        self.mmap.close()
+
+    def is_current(self, source: Path, flags: int) -> bool:
+        """ Check if index was build from source with same options. """
+
+        if flags != self.flags:
+            return False
+        try:
+            stat = source.stat()
+        except OSError:
+            # Without a source the index is all there is.
+            return True
+        if (stat.st_size == self.source_size
+                and stat.st_mtime_ns == self.source_mtime):
+            return True
+        return CherryIndex.file_hash(source) == self.source_hash
+
+    def field(self, column: str, row: int) -> str:
+        """ Get text of a single column and row.
+
+        Rows of the columns "code" and "code_emoji" are the entries of the
+        shortcode table.
+        """
+
+        return str(self.field_bytes(column, row), 'utf-8')
+
+    def field_bytes(self, column: str, row: int) -> bytes:
+        """ Get UTF-8 encoded text of a single column and row. """
+
+        offsets: memoryview = self.offsets[column]
+        start: int = self.data_pos[column] + offsets[row]
+        end: int = self.data_pos[column] + offsets[row + 1]
+        if column in ('line', 'code'):
+            end -= 1
+        return self.mmap[start:end]
+
+    def line(self, row: int) -> str:
+        """ Get complete menu entry of a row. """
+
+        return self.field('line', row)
+
+    def lines_bytes(self) -> bytes:
+        """ Get all menu entries as a block of text, one row per line. """
+
+        start: int = self.data_pos['line']
+        return self.mmap[start:start + self.offsets['line'][self.rows]]
+
+    def lines_text(self) -> str:
+        """ Get all menu entries as a single string, one row per line. """
+
+        return str(self.lines_bytes(), 'utf-8')
+
+    def iter_chunks(self, chunk_size: int = 1 << 16) -> Iterator[bytes]:
+        """ Get all menu entries as blocks of about chunk_size bytes. """
+
+        data: bytes = self.lines_bytes()
+        position: int = 0
+        while position < len(data):
+            end: int = data.find(b'\n', position + chunk_size) + 1
+            if end <= 0:
+                end = len(data)
+            yield data[position:end]
+            position = end
+
+    def shortcode_list(self) -> list[bytes]:
+        """ Get all shortcodes in sorted order as UTF-8, split only once. """
+
+        if self.code_list is None:
+            start: int = self.data_pos['code']
+            data: bytes = self.mmap[start:start
+                                    + self.offsets['code'][self.codes]]
+            self.code_list = data.split(b'\n')[0:self.codes]
+        return self.code_list
+
+    def shortcode(self, code: bytes) -> bytes | None:
+        """ Get emoji of a shortcode like b':thumbs_up:', both UTF-8. """
+
+        codes: list[bytes] = self.shortcode_list()
+        number: int = bisect.bisect_left(codes, code)
+        if number < len(codes) and codes[number] == code:
+            return self.field_bytes('code_emoji', number)
+        return None
+
+    def row_at(self, position: int) -> int:
+        """ Get row of a byte position in the text of column "line". """
+
+        relative: int = position - self.data_pos['line']
+        return bisect.bisect_right(self.offsets['line'], relative) - 1
+
+    def find(self, pattern: str, ignore_case=False) -> int | None:
+        """ Get first row with pattern in its menu entry. """
+
+        return next(self.find_all(pattern, ignore_case), None)
+
+    def find_all(self, pattern: str, ignore_case=False) -> Iterator[int]:
+        """ Get all rows with pattern in their menu entry in order. """
+
+        if not self.rows:
+            return
+        start: int = self.data_pos['line']
+        end: int = start + self.offsets['line'][self.rows]
+        if not ignore_case or pattern.isascii():
+            flags: int = re.IGNORECASE if ignore_case else 0
+            regex = re.compile(re.escape(pattern.encode('utf-8')), flags)
+            row: int = -1
+            position: int = start
+            while match := regex.search(self.mmap, position, end):
+                row = self.row_at(match.start())
+                yield row
+                # Continue at next row, to report each row only once.
+                position = start + self.offsets['line'][row + 1]
+        else:
+            pattern = pattern.lower()
+            for row, line in enumerate(self.lines_text().splitlines()):
+                if pattern in line.lower():
+                    yield row
+
+    @classmethod
+    def file_hash(cls, path: Path) -> bytes:
+        """ Get SHA-256 checksum of a file. """
+
+        import hashlib
+
+        digest = hashlib.sha256()
+        with open(path, 'rb') as file:
+            while chunk := file.read(1 << 16):
+                digest.update(chunk)
+        return digest.digest()
+
+    @classmethod
+    def write(cls,
+              path: Path,
+              rows: Iterable[tuple],
+              source: Path,
+              flags: int,
+              codes: Iterable[tuple[str, str]] = (),
+              batch_size: int = 4096) -> None:
+        """ Create index file from rows of emoji, name, category and
+        shortname.
+
+        Rows are consumed in batches and each column is written to its own
+        temporary file, which are joined at the end. So memory usage does not
+        grow with the number of rows. Shortcodes of the rows and the pairs of
+        shortcode and emoji in codes are sorted the same way for the
+        shortcode table, the first row wins on dupes.
+        """
+
+        import shutil
+        import tempfile
+
+        names: tuple[str, ...] = cls.columns + cls.code_columns
+        tables: list = [tempfile.TemporaryFile() for _ in names]
+        datas: list = [tempfile.TemporaryFile() for _ in names]
+        sizes: list[int] = [0] * len(names)
+        counts: list[int] = [0] * len(names)
+        batch: list[tuple] = []
+        sorter = RunSorter(1)
+        temp: Path = temp_path(path)
+
+        def append(first: int, columns: list[list[bytes]]) -> None:
+            """ Write texts of columns from first on to temporary files. """
+
+            for column, texts in enumerate(columns, first):
+                offsets = array.array('Q', itertools.accumulate(
+                    map(len, texts), initial=sizes[column]))
+                sizes[column] = offsets.pop()
+                counts[column] += len(texts)
+                tables[column].write(offsets.tobytes())
+                datas[column].write(b''.join(texts))
+            return None
+
+        def flush() -> None:
+            """ Write collected rows to the temporary column files. """
+
+            if not batch:
+                return None
+            fields: list[list[bytes]] = [list(map(str.encode, column))
+                                         for column in zip(*batch)]
+            lines: list[bytes] = [b'%s %s ~ %s\n' % row
+                                  for row in zip(*fields[0:3])]
+            append(0, [lines] + fields)
+            for emoji, shortname in zip(fields[0], fields[3]):
+                if shortname and b'\n' not in shortname:
+                    sorter.add(0, shortname, (shortname, emoji))
+            batch.clear()
+            return None
+
+        def flush_codes() -> None:
+            """ Write collected shortcodes to the temporary table files. """
+
+            if not batch:
+                return None
+            append(len(cls.columns), [[code + b'\n' for code, _ in batch],
+                                      [emoji for _, emoji in batch]])
+            batch.clear()
+            return None
+
+        try:
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    flush()
+            flush()
+            for shortname, emoji in codes:
+                if shortname and '\n' not in shortname:
+                    sorter.add(0, shortname.encode(),
+                               (shortname.encode(), emoji.encode()))
+            # Sorted by shortcode, then in order added, so first row wins.
+            for _, same in itertools.groupby(sorter, lambda pair: pair[0]):
+                batch.append(next(same))
+                if len(batch) >= batch_size:
+                    flush_codes()
+            flush_codes()
+            stat = source.stat()
+            header: bytes = cls.header.pack(cls.magic, cls.version, flags,
+                                            counts[0], stat.st_size,
+                                            stat.st_mtime_ns,
+                                            cls.file_hash(source),
+                                            counts[-1])
+            # Offset tables are aligned to 8 bytes, from the first one on.
+            start: int = cls.header.size + cls.column_entry.size * len(names)
+            pos: int = start + (-start % 8)
+            entries: list[bytes] = []
+            for column in range(len(names)):
+                # Closing offset of last row, so each table has count + 1.
+                tables[column].write(array.array('Q', [sizes[column]])
+                                     .tobytes())
+                table_size: int = 8 * (counts[column] + 1)
+                entries.append(cls.column_entry.pack(pos, pos + table_size))
+                pos += table_size + sizes[column] + (-sizes[column] % 8)
+            with open(temp, 'wb') as file:
+                file.write(header)
+                file.write(b''.join(entries))
+                file.write(b'\0' * (-start % 8))
+                for column in range(len(names)):
+                    for part in (tables[column], datas[column]):
+                        part.seek(0)
+                        shutil.copyfileobj(part, file)
+                    file.write(b'\0' * (-sizes[column] % 8))
+            temp.replace(path)
+        finally:
+            temp.unlink(missing_ok=True)
+            for part in tables + datas:
+                part.close()
+
+
+class TokenIndex:
+    """ Memory-mapped inverted index of words in the binary emoji index.
+
+    All words of name, category and shortname are sorted as UTF-8 bytes,
+    each with a list of rows it appears in. Because posting lists are stored
+    in the same order as the words, all words with a common prefix share a
+    single continuous range of postings.
+    """
+
+    magic: bytes = b'CHERRYTK'
+    version: int = 1
+    # magic, version, flags, rows and source sha256 of the binary index,
+    # number of words, positions of word offsets, words, posting offsets,
+    # postings and number of words in name of each row
+    header: struct.Struct = struct.Struct('<8sHHQ32sQQQQQQ')
+
+    def __init__(self, path: Path) -> None:
+        """ Open token index file and read its header. """
+
+        self.path: Path = path
+        with open(path, 'rb') as file:
+            try:
+                self.mmap: mmap.mmap = mmap.mmap(file.fileno(), 0,
+                                                 access=mmap.ACCESS_READ)
+            except (ValueError, OSError):
+                raise ValueError(f'Empty or unreadable index: {path}')
+        try:
+            (magic, version, self.flags, self.rows, self.source_hash,
+             self.count, words_pos, self.data_pos, postings_pos,
+             self.postings_data_pos, self.name_sizes_pos) = (
+                TokenIndex.header.unpack_from(self.mmap))
+        except struct.error:
+            self.mmap.close()
+            raise ValueError(f'Broken index: {path}')
+        if magic != TokenIndex.magic or version != TokenIndex.version:
+            self.mmap.close()
+            raise ValueError(f'Unknown index format: {path}')
+        self.view: memoryview = memoryview(self.mmap)
+        size: int = 8 * (self.count + 1)
+        self.word_offsets: memoryview = (
+            self.view[words_pos:words_pos + size].cast('Q'))
+        self.posting_offsets: memoryview = (
+            self.view[postings_pos:postings_pos + size].cast('Q'))
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, number: int) -> bytes:
+        """ Get word as UTF-8 bytes, to bisect the sorted words. """
+
+        if not 0 <= number < self.count:
+            raise IndexError(number)
+        start: int = self.data_pos + self.word_offsets[number]
+        return self.mmap[start:self.data_pos + self.word_offsets[number + 1]]
+
+    def matches(self, index: CherryIndex) -> bool:
+        """ Check if token index was built from this binary index. """
+
+        return (self.flags == index.flags
+                and self.rows == len(index)
+                and self.source_hash == index.source_hash)
+
+    def name_size(self, row: int) -> int:
+        """ Get number of words in name of a row. """
+
+        return self.mmap[self.name_sizes_pos + row]
+
+    def postings(self, first: int, last: int) -> memoryview:
+        """ Get rows of all words in range, with duplicates. """
+
+        start: int = (self.postings_data_pos
+                      + 4 * self.posting_offsets[first])
+        end: int = self.postings_data_pos + 4 * self.posting_offsets[last]
+        return self.view[start:end].cast('I')
+
+    def lookup(self, word: str) -> tuple[set[int], set[int]]:
+        """ Get rows with word as exact match and rows with word as prefix. """
+
+        prefix: bytes = word.encode('utf-8')
+        first: int = bisect.bisect_left(self, prefix)
+        last: int = bisect.bisect_left(self, prefix + b'\xff', first)
+        exact: set[int] = set()
+        if first < last and self[first] == prefix:
+            exact = set(self.postings(first, first + 1))
+        return exact, set(self.postings(first, last))
+
+    def search(self, words: list[str]) -> dict[int, tuple[int, int]]:
+        """ Get rows matching all words with number of exact and prefix
+        matches. """
+
+        lookups: list[tuple[set[int], set[int]]] = []
+        rows: set[int] | None = None
+        for word in words:
+            exact, prefixed = self.lookup(word)
+            lookups.append((exact, prefixed))
+            rows = prefixed if rows is None else rows & prefixed
+            if not rows:
+                return {}
+        result: dict[int, tuple[int, int]] = {}
+        for row in rows or ():
+            exact_count: int = sum(row in exact for exact, _ in lookups)
+            result[row] = (exact_count, len(words) - exact_count)
+        return result
+
+    @classmethod
+    def write(cls, path: Path, index: CherryIndex) -> None:
+        """ Create token index file from all rows of a binary index. """
+
+        postings: dict[bytes, list[int]] = {}
+        name_sizes = bytearray()
+        for row in range(len(index)):
+            name: list[str] = tokenize(index.field('name', row))
+            name_sizes.append(min(len(name), 255))
+            text: str = ' '.join((index.field('category', row),
+                                  index.field('shortname', row)))
+            for word in dict.fromkeys(name + tokenize(text)):
+                postings.setdefault(word.encode('utf-8'), []).append(row)
+        words: list[bytes] = sorted(postings)
+        word_offsets = array.array('Q', itertools.accumulate(
+            map(len, words), initial=0))
+        posting_offsets = array.array('Q', itertools.accumulate(
+            (len(postings[word]) for word in words), initial=0))
+        rows = array.array('I')
+        for word in words:
+            rows.extend(postings[word])
+        data: bytes = b''.join(words)
+        words_pos: int = cls.header.size + (-cls.header.size % 8)
+        data_pos: int = words_pos + 8 * len(word_offsets)
+        postings_pos: int = data_pos + len(data) + (-len(data) % 8)
+        postings_data_pos: int = postings_pos + 8 * len(posting_offsets)
+        name_sizes_pos: int = postings_data_pos + 4 * len(rows)
+        header: bytes = cls.header.pack(cls.magic, cls.version, index.flags,
+                                        len(index), index.source_hash,
+                                        len(words), words_pos, data_pos,
+                                        postings_pos, postings_data_pos,
+                                        name_sizes_pos)
+        temp: Path = temp_path(path)
+        with open(temp, 'wb') as file:
+            file.write(header)
+            file.write(b'\0' * (words_pos - len(header)))
+            file.write(word_offsets.tobytes())
+            file.write(data)
+            file.write(b'\0' * (postings_pos - data_pos - len(data)))
+            file.write(posting_offsets.tobytes())
+            file.write(rows.tobytes())
+            file.write(name_sizes)
+        temp.replace(path)
+
+
+class CherryDatabase:
+    """ Optional SQLite backend for emojis, favorites and usage history.
+
+    Uses only the sqlite3 module of the standard library and keeps all in a
+    single file. Emojis are copied from the binary index whenever it was
+    rebuilt, with an FTS5 table over names, categories and shortnames for
+    word searches. Favorites are synced from their file when its
+    modification time or size changes, by adding and removing only the
+    changed lines. Uses of emojis are counted with the same frecency key as
+    in Recents.
+    """
+
+    version: int = 1
+    schema: str = """
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS emojis (
+            row INTEGER PRIMARY KEY,
+            line TEXT NOT NULL,
+            emoji TEXT NOT NULL,
+            name TEXT NOT NULL,
+            category TEXT NOT NULL,
+            shortname TEXT NOT NULL,
+            name_size INTEGER NOT NULL
+        );
+        CREATE VIRTUAL TABLE IF NOT EXISTS emojis_fts USING fts5 (
+            name, category, shortname,
+            content='emojis', content_rowid='row',
+            tokenize="unicode61 remove_diacritics 0 tokenchars '_'"
+        );
+        CREATE TABLE IF NOT EXISTS favorites (
+            line TEXT PRIMARY KEY,
+            position INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS uses (
+            line TEXT PRIMARY KEY,
+            key REAL NOT NULL,
+            count INTEGER NOT NULL,
+            last REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS uses_key ON uses (key DESC, last DESC);
+    """
+
+    def __init__(self, path: Path) -> None:
+        """ Open or create database file with all tables. """
+
+        import sqlite3
+
+        self.path: Path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # The menu list is read from another thread, but never at the same
+        # time as the main thread uses the connection.
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        try:
+            version: int = self.connection.execute(
+                'PRAGMA user_version').fetchone()[0]
+            if version != CherryDatabase.version:
+                self.connection.executescript("""
+                    DROP TABLE IF EXISTS emojis_fts;
+                    DROP TABLE IF EXISTS emojis;
+                    DROP TABLE IF EXISTS favorites;
+                    DROP TABLE IF EXISTS uses;
+                    DROP TABLE IF EXISTS meta;
+                """)
+                self.connection.executescript(CherryDatabase.schema)
+                self.connection.execute(
+                    f'PRAGMA user_version = {CherryDatabase.version}')
+        except sqlite3.Error as error:
+            self.connection.close()
+            raise ValueError(f'Unusable database {path}: {error}')
+        self.rows: int = self.count()
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def close(self) -> None:
+        """ Close connection to the database file. """
+
+        self.connection.close()
+
+    def count(self) -> int:
+        """ Count rows of emojis table. """
+
+        return self.connection.execute(
+            'SELECT count(*) FROM emojis').fetchone()[0]
+
+    def get_meta(self, key: str) -> str | None:
+        """ Get a value of the meta table. """
+
+        row: tuple | None = self.connection.execute(
+            'SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str) -> None:
+        """ Set a value of the meta table. """
+
+        self.connection.execute(
+            'INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+            (key, value))
+        return None
+
+    def sync_index(self, index: CherryIndex) -> bool:
+        """ Copy all rows of the binary index, if it has changed. """
+
+        state: str = f'{index.source_hash.hex()} {index.flags} {len(index)}'
+        if self.get_meta('index') == state:
+            return False
+        rows: Iterator[tuple] = (
+            (row, index.line(row), index.field('emoji', row),
+             index.field('name', row), index.field('category', row),
+             index.field('shortname', row),
+             len(tokenize(index.field('name', row))))
+            for row in range(len(index)))
+        with self.connection:
+            self.connection.execute('DELETE FROM emojis')
+            self.connection.executemany(
+                'INSERT INTO emojis VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+            self.connection.execute(
+                "INSERT INTO emojis_fts (emojis_fts) VALUES ('rebuild')")
+            self.set_meta('index', state)
+        self.rows = self.count()
+        return True
+
+    def sync_favorites(self, path: Path | None) -> bool:
+        """ Update favorites from file, if its modification time changed. """
+
+        stat_key: tuple | None = App.stat_key(path)
+        state: str = repr(stat_key[1:]) if stat_key else ''
+        if self.get_meta('favorites') == state:
+            return False
+        lines: list[str] = []
+        if path and stat_key:
+            lines = list(dict.fromkeys(line for line in
+                                       path.read_text().splitlines()
+                                       if line))
+        positions: dict[str, int] = {line: position
+                                     for position, line in enumerate(lines)}
+        with self.connection:
+            current: dict[str, int] = dict(self.connection.execute(
+                'SELECT line, position FROM favorites'))
+            self.connection.executemany(
+                'DELETE FROM favorites WHERE line = ?',
+                ((line,) for line in current.keys() - positions.keys()))
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO favorites (line, position) '
+                'VALUES (?, ?)',
+                ((line, position) for line, position in positions.items()
+                 if current.get(line) != position))
+            self.set_meta('favorites', state)
+        return True
+
+    def import_recents(self, recents: Recents) -> bool:
+        """ Add uses of a recents file once, when the database is new. """
+
+        if self.get_meta('recents') is not None:
+            return False
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO uses (line, key, count, last) '
+                'VALUES (?, ?, ?, ?)',
+                ((line, *entry) for line, entry in recents.entries.items()))
+            self.set_meta('recents', recents.path.as_posix())
+        return True
+
+    def favorites(self) -> list[str]:
+        """ Get all favorites in order of their file. """
+
+        return [line for line, in self.connection.execute(
+            'SELECT line FROM favorites ORDER BY position')]
+
+    def top(self, size: int) -> list[str]:
+        """ Get used entries with highest frecency first. """
+
+        return [line for line, in self.connection.execute(
+            'SELECT line FROM uses ORDER BY key DESC, last DESC LIMIT ?',
+            (size,))]
+
+    def use(self, lines: list[str], stamp: float | None = None) -> None:
+        """ Count a use of each line in one transaction. """
+
+        if stamp is None:
+            stamp = time.time()
+        with self.connection:
+            for line in lines:
+                row: tuple | None = self.connection.execute(
+                    'SELECT key FROM uses WHERE line = ?', (line,)).fetchone()
+                key: float = Recents.frecency(row[0] if row else None, stamp)
+                self.connection.execute(
+                    'INSERT INTO uses (line, key, count, last) '
+                    'VALUES (?, ?, 1, ?) '
+                    'ON CONFLICT (line) DO UPDATE SET key = excluded.key, '
+                    'count = count + 1, last = max(last, excluded.last)',
+                    (line, key, stamp))
+        return None
+
+    def field_bytes(self, column: str, row: int) -> bytes:
+        """ Get UTF-8 encoded text of a single column and row. """
+
+        if column not in ('line', 'emoji', 'name', 'category', 'shortname'):
+            raise KeyError(column)
+        value: tuple | None = self.connection.execute(
+            f'SELECT {column} FROM emojis WHERE row = ?', (row,)).fetchone()
+        if value is None:
+            raise IndexError(row)
+        return value[0].encode('utf-8')
+
+    def line(self, row: int) -> str:
+        """ Get complete menu entry of a row. """
+
+        value: tuple | None = self.connection.execute(
+            'SELECT line FROM emojis WHERE row = ?', (row,)).fetchone()
+        if value is None:
+            raise IndexError(row)
+        return value[0]
+
+    def name_size(self, row: int) -> int:
+        """ Get number of words in the name of a row. """
+
+        return self.connection.execute(
+            'SELECT name_size FROM emojis WHERE row = ?', (row,)).fetchone()[0]
+
+    def iter_chunks(self, chunk_size: int = 1 << 16) -> Iterator[bytes]:
+        """ Get all menu entries as blocks of lines, in order of rows. """
+
+        cursor = self.connection.execute(
+            'SELECT line FROM emojis ORDER BY row')
+        # Number of rows per chunk, for lines of about 40 bytes.
+        rows: int = max(1, chunk_size // 40)
+        while lines := cursor.fetchmany(rows):
+            yield ''.join(line + '\n' for line, in lines).encode('utf-8')
+
+    def lines_text(self) -> str:
+        """ Get all menu entries as a single string, one row per line. """
+
+        return ''.join(str(chunk, 'utf-8') for chunk in self.iter_chunks())
+
+    def search(self, words: list[str]) -> list[tuple[int, int, str, int]]:
+        """ Get rows matching all words as prefix, with number of exact
+        matches, emoji and name size of each row. """
+
+        quoted: list[str] = ['"' + word.replace('"', '""') + '"'
+                             for word in words]
+        exact: list[set[int]] = [
+            {row for row, in self.connection.execute(
+                'SELECT rowid FROM emojis_fts WHERE emojis_fts MATCH ?',
+                (word,))}
+            for word in quoted]
+        cursor = self.connection.execute(
+            'SELECT emojis.row, emojis.emoji, emojis.name_size '
+            'FROM emojis_fts JOIN emojis ON emojis.row = emojis_fts.rowid '
+            'WHERE emojis_fts MATCH ?',
+            (' AND '.join(word + ' *' for word in quoted),))
+        return [(row, sum(row in rows for rows in exact), emoji, name_size)
+                for row, emoji, name_size in cursor]
+
+
+def tokenize(text: str) -> list[str]:
+    """ Split text into lowercase words for searching. """
+
+    return re.findall(r'\w+', text.lower())
+
+
+def rank_words(words: list[str], tokens: list[str]) -> tuple[int, int] | None:
+    """ Get number of exact and prefix matches, if all words match. """
+
+    exact_count: int = 0
+    for word in words:
+        if word in tokens:
+            exact_count += 1
+        elif not any(token.startswith(word) for token in tokens):
+            return None
+    return exact_count, len(words) - exact_count
+
+
+# Scores of fuzzy matching, same as in "fzf".
+FUZZY_SCORE_MATCH: int = 16
+FUZZY_GAP_START: int = -3
+FUZZY_GAP_EXTENSION: int = -1
+FUZZY_BONUS_BOUNDARY: int = 8
+FUZZY_BONUS_CAMEL: int = 7
+FUZZY_BONUS_CONSECUTIVE: int = -(FUZZY_GAP_START + FUZZY_GAP_EXTENSION)
+FUZZY_BONUS_FIRST_MULTIPLIER: int = 2
+
+
+def fuzzy_regex(pattern: str, ignore_case=False) -> re.Pattern:
+    """ Compile expression to find lines with characters of pattern.
+
+    Each character is preceded by a class excluding itself, so the first
+    occurrence in order is found without backtracking over the line.
+    """
+
+    chars: list[str] = list(map(re.escape, pattern))
+    expression: str = chars[0] + ''.join(f'[^\\n{char}]*{char}'
+                                         for char in chars[1:])
+    return re.compile(expression, re.IGNORECASE if ignore_case else 0)
+
+
+def fuzzy_bonus(text: str, position: int) -> int:
+    """ Get bonus for a character at word boundary or camel case. """
+
+    if position == 0:
+        return FUZZY_BONUS_BOUNDARY
+    previous: str = text[position - 1]
+    current: str = text[position]
+    if not previous.isalnum():
+        return FUZZY_BONUS_BOUNDARY if current.isalnum() else 0
+    if ((previous.islower() and current.isupper())
+            or (not previous.isdigit() and current.isdigit())):
+        return FUZZY_BONUS_CAMEL
+    return 0
+
+
+def fuzzy_score(pattern: str,
+                text: str,
+                ignore_case=False,
+                start: int = 0,
+                end: int | None = None,
+                folded: str | None = None) -> int | None:
+    """ Score characters of pattern in order in text, None if no match.
+
+    Same algorithm as version 1 of "fzf": find first occurrence in order,
+    then shrink it from the end to the shortest window, score matches with
+    bonuses for word boundaries and consecutive characters and penalties for
+    gaps. Pattern must be lowercase if case is ignored. If the end of the
+    first occurrence is already known, the search is limited to the given
+    range of text. A lowercase copy of text with same length can be given
+    as folded, to compare without converting each character.
+    """
+
+    def char_at(position: int) -> str:
+        """ Get character to compare with pattern. """
+
+        if folded is not None:
+            return folded[position]
+        return text[position].lower() if ignore_case else text[position]
+
+    pattern_index: int
+    if end is None:
+        pattern_index = 0
+        first: int = -1
+        for position in range(start, len(text)):
+            if char_at(position) == pattern[pattern_index]:
+                if first < 0:
+                    first = position
+                pattern_index += 1
+                if pattern_index == len(pattern):
+                    end = position + 1
+                    break
+        if end is None:
+            return None
+        start = first
+    pattern_index = len(pattern) - 1
+    for position in range(end - 1, start - 1, -1):
+        if char_at(position) == pattern[pattern_index]:
+            pattern_index -= 1
+            if pattern_index < 0:
+                start = position
+                break
+    if pattern_index >= 0:
+        return None
+
+    score: int = 0
+    consecutive: int = 0
+    first_bonus: int = 0
+    in_gap: bool = False
+    pattern_index = 0
+    for position in range(start, end):
+        if (pattern_index < len(pattern)
+                and char_at(position) == pattern[pattern_index]):
+            bonus: int = fuzzy_bonus(text, position)
+            if consecutive == 0:
+                first_bonus = bonus
+            else:
+                if bonus >= FUZZY_BONUS_BOUNDARY and bonus > first_bonus:
+                    first_bonus = bonus
+                bonus = max(bonus, first_bonus, FUZZY_BONUS_CONSECUTIVE)
+            if pattern_index == 0:
+                score += (FUZZY_SCORE_MATCH
+                          + bonus * FUZZY_BONUS_FIRST_MULTIPLIER)
+            else:
+                score += FUZZY_SCORE_MATCH + bonus
+            consecutive += 1
+            in_gap = False
+            pattern_index += 1
+        else:
+            score += FUZZY_GAP_EXTENSION if in_gap else FUZZY_GAP_START
+            consecutive = 0
+            first_bonus = 0
+            in_gap = True
+    return score
+
+
+class IncrementalSearch:
+    """ Search lines for words, refining the last result on each keystroke.
+
+    Lines match if they contain all words of the query. A lowercase copy of
+    all lines is searched, unless the query has uppercase letters and case
+    is not ignored. The copy is made in parts with fold(), while the menu
+    waits for keys, or else at once by the first search needing it. The
+    result of each query is kept, so a query extending the last one only
+    checks the rows of its result and only its new words, while deleting
+    characters goes back to an earlier result without searching at all.
+    """
+
+    def __init__(self, lines: list[str], ignore_case=False) -> None:
+        """ Construct search of lines, without their lowercase copy yet. """
+
+        self.lines: list[str] = lines
+        self.folded: list[str] = []
+        self.ignore_case: bool = ignore_case
+        # Query, if it is case sensitive and numbers of its matching lines.
+        self.history: list[tuple[str, bool, Sequence[int]]] = [
+            ('', False, range(len(lines)))]
+
+    def fold(self, count: int | None = None) -> bool:
+        """ Add count lines or all others to the lowercase copy.
+
+        Returns True, if the copy is complete.
+        """
+
+        done: int = len(self.folded)
+        end: int = (len(self.lines) if count is None
+                    else min(done + count, len(self.lines)))
+        self.folded.extend(map(str.lower, self.lines[done:end]))
+        return end == len(self.lines)
+
+    def search(self, query: str) -> Sequence[int]:
+        """ Get numbers of lines matching the query, in order of lines. """
+
+        while (len(self.history) > 1
+                and not query.startswith(self.history[-1][0])):
+            self.history.pop()
+        last_query, last_sensitive, rows = self.history[-1]
+        if query == last_query:
+            return rows
+        sensitive: bool = not self.ignore_case and query != query.lower()
+        if not sensitive:
+            self.fold()
+        haystack: list[str] = self.lines if sensitive else self.folded
+        known: list[str] = []
+        if sensitive == last_sensitive:
+            known = (last_query if sensitive else last_query.lower()).split()
+        for word in (query if sensitive else query.lower()).split():
+            if word not in known:
+                rows = [row for row in rows if word in haystack[row]]
+        self.history.append((query, sensitive, rows))
+        return rows
+
+
+def clip_columns(text: str, columns: int) -> str:
+    """ Cut text to fit into terminal columns, wide characters take two. """
+
+    import unicodedata
+
+    if text.isascii():
+        return text[:max(columns, 0)]
+    width: int = 0
+    for position, char in enumerate(text):
+        if unicodedata.category(char) in ('Mn', 'Me', 'Cf'):
+            continue
+        width += 2 if unicodedata.east_asian_width(char) in ('W', 'F') else 1
+        if width > columns:
+            return text[:position]
+    return text
+
+
+def pick_lines(lines: list[str],
+               prompt: str = '',
+               list_size: int = 15,
+               multi=False,
+               ignore_case=False,
+               query: str = '') -> list[str]:
+    """ Select lines in the built-in terminal menu, empty if cancelled.
+
+    The menu is drawn with curses on the terminal, even if stdin or stdout
+    are redirected, and raises OSError without a terminal. Typing searches
+    with IncrementalSearch, arrow keys move, Tab marks lines if multi is
+    set, Enter selects and Escape cancels.
+    """
+
+    import curses
+    import locale
+
+    search = IncrementalSearch(lines, ignore_case)
+    locale.setlocale(locale.LC_ALL, '')
+    os.environ.setdefault('ESCDELAY', '25')
+    sys.stdout.flush()
+    saved: list[tuple[int, int]] = []
+    tty: int | None = None
+    try:
+        for fd in (0, 1):
+            if not os.isatty(fd):
+                if tty is None:
+                    tty = os.open('/dev/tty', os.O_RDWR)
+                saved.append((fd, os.dup(fd)))
+                os.dup2(tty, fd)
+        try:
+            return curses.wrapper(run_picker, search, prompt, list_size,
+                                  multi, query)
+        except curses.error as error:
+            raise OSError(f'Can not draw menu on terminal: {error}')
+    finally:
+        for fd, copy in saved:
+            os.dup2(copy, fd)
+            os.close(copy)
+        if tty is not None:
+            os.close(tty)
+
+
+def run_picker(screen: curses.window,
+               search: IncrementalSearch,
+               prompt: str,
+               list_size: int,
+               multi: bool,
+               query: str) -> list[str]:
+    """ Draw the menu of pick_lines() and handle keys until it is closed.
+
+    Only the visible rows are drawn. All keys typed while searching are
+    handled together, so a fast typist causes one search, not one for each
+    key. Until a key is typed, the lowercase copy of the search is made in
+    parts, so the menu is drawn before all lines are folded.
+    """
+
+    import curses
+
+    rows: Sequence[int] = search.search(query)
+    cursor: int = 0
+    top: int = 0
+    marked: dict[int, None] = {}
+    screen.keypad(True)
+    try:
+        while True:
+            height, width = screen.getmaxyx()
+            size: int = max(1, min(list_size, height - 1))
+            cursor = max(0, min(cursor, len(rows) - 1))
+            if cursor < top:
+                top = cursor
+            elif cursor >= top + size:
+                top = cursor - size + 1
+            screen.erase()
+            for line, position in enumerate(
+                    range(top, min(top + size, len(rows))), 1):
+                mark: str = '>' if position == cursor else ' '
+                if multi:
+                    mark += '*' if rows[position] in marked else ' '
+                text: str = clip_columns(
+                    f'{mark} {search.lines[rows[position]]}', width - 1)
+                try:
+                    screen.addstr(line, 0, text,
+                                  curses.A_REVERSE if position == cursor
+                                  else curses.A_NORMAL)
+                except curses.error:
+                    pass
+            counter: str = f' {len(rows)}/{len(search.lines)}'
+            try:
+                screen.addstr(0, max(width - len(counter) - 1, 0), counter,
+                              curses.A_DIM)
+                screen.addstr(0, 0, clip_columns(f'{prompt} {query}',
+                                                 width - len(counter) - 2))
+            except curses.error:
+                pass
+            screen.refresh()
+
+            keys: list[str | int] = []
+            screen.nodelay(True)
+            try:
+                while not keys and not search.fold(4096):
+                    try:
+                        keys.append(screen.get_wch())
+                    except curses.error:
+                        pass
+            finally:
+                screen.nodelay(False)
+            if not keys:
+                keys.append(screen.get_wch())
+            screen.nodelay(True)
+            try:
+                while True:
+                    keys.append(screen.get_wch())
+            except curses.error:
+                pass
+            finally:
+                screen.nodelay(False)
+            typed: str = query
+            for key in keys:
+                if isinstance(key, str) and key.isprintable():
+                    typed += key
+                    continue
+                elif key in (curses.KEY_BACKSPACE, '\x7f', '\x08'):
+                    typed = typed[:-1]
+                    continue
+                elif key == '\x15':
+                    typed = ''
+                    continue
+                elif key == '\x17':
+                    words: list[str] = typed.rstrip().rsplit(' ', 1)
+                    typed = words[0] + ' ' if len(words) > 1 else ''
+                    continue
+                if typed != query:
+                    query = typed
+                    rows = search.search(query)
+                    cursor = 0
+                cursor = max(0, min(cursor, len(rows) - 1))
+                if key in (curses.KEY_UP, '\x10'):
+                    cursor = max(cursor - 1, 0)
+                elif key in (curses.KEY_DOWN, '\x0e'):
+                    cursor += 1
+                elif key == curses.KEY_PPAGE:
+                    cursor = max(cursor - size, 0)
+                elif key == curses.KEY_NPAGE:
+                    cursor += size
+                elif key == '\t' and multi and rows:
+                    if rows[cursor] in marked:
+                        del marked[rows[cursor]]
+                    else:
+                        marked[rows[cursor]] = None
+                    cursor += 1
+                elif key in ('\n', '\r', curses.KEY_ENTER):
+                    if marked:
+                        return [search.lines[row] for row in marked]
+                    return [search.lines[rows[cursor]]] if rows else []
+                elif key in ('\x1b', '\x07', '\x03'):
+                    return []
+            if typed != query:
+                query = typed
+                rows = search.search(query)
+                cursor = 0
+    except KeyboardInterrupt:
+        return []
+
+
+class RunSorter:
+    """ Sort rows into groups with bounded memory.
+
+    Rows are collected with a sort key for each group. When too many rows are
+    collected, each group is sorted and spilled as a run to a temporary file.
+    Iterating merges all runs of a group, one group after another. Rows with
+    same key keep the order they were added in.
+    """
+
+    def __init__(self, groups: int, run_size: int = 50_000) -> None:
+        """ Construct sorter for number of groups. """
+
+        self.run_size: int = run_size
+        self.buffers: list[list[tuple]] = [[] for _ in range(groups)]
+        self.runs: list[list] = [[] for _ in range(groups)]
+        self.size: int = 0
+        self.sequence: int = 0
+
+    def add(self, group: int, key, row: tuple) -> None:
+        """ Add a row with its sort key to a group. """
+
+        self.buffers[group].append((key, self.sequence, row))
+        self.sequence += 1
+        self.size += 1
+        if self.size >= self.run_size:
+            self.spill()
+
+    def spill(self) -> None:
+        """ Write sorted buffers as runs to temporary files. """
+
+        import pickle
+        import tempfile
+
+        for group, buffer in enumerate(self.buffers):
+            if buffer:
+                buffer.sort()
+                file = tempfile.TemporaryFile()
+                for start in range(0, len(buffer), 4096):
+                    pickle.dump(buffer[start:start + 4096], file,
+                                pickle.HIGHEST_PROTOCOL)
+                file.seek(0)
+                self.runs[group].append(file)
+                self.buffers[group] = []
+        self.size = 0
+
+    @classmethod
+    def read_run(cls, file) -> Iterator[tuple]:
+        """ Read back sorted entries of a spilled run. """
+
+        import pickle
+
+        with file:
+            while True:
+                try:
+                    yield from pickle.load(file)
+                except EOFError:
+                    return
+
+    def __iter__(self) -> Iterator[tuple]:
+        for group, buffer in enumerate(self.buffers):
+            buffer.sort()
+            if self.runs[group]:
+                runs: list = [RunSorter.read_run(file)
+                              for file in self.runs[group]]
+                runs.append(iter(buffer))
+                for _, _, row in heapq.merge(*runs):
+                    yield row
+            else:
+                for _, _, row in buffer:
+                    yield row
+            self.buffers[group] = []
+            self.runs[group] = []
+
+
+def iter_json_records(path: Path,
+                      key: str,
+                      chunk_size: int = 1 << 16) -> Iterator[dict]:
+    """ Read objects of an array in a JSON file one after another.
+
+    Only the array at given key is read and only a chunk of the file is held
+    in memory at once. All complete objects of a chunk are decoded together,
+    single objects are decoded only if that fails. Compressed files are read
+    as by open_text().
+    """
+
+    import json
+
+    decoder = json.JSONDecoder()
+    start = re.compile(r'"' + re.escape(key) + r'"\s*:\s*\[')
+    separator = re.compile(r'[\s,]*')
+    with open_text(path) as file:
+        buffer: str = ''
+        match = None
+        while match is None:
+            chunk: str = file.read(chunk_size)
+            if not chunk:
+                raise ValueError(f'No array "{key}" found in: {path}')
+            buffer += chunk
+            match = start.search(buffer)
+        pos: int = match.end()
+        eof: bool = False
+        batch: bool = True
+        while True:
+            pos = separator.match(buffer, pos).end()
+            if pos < len(buffer) and buffer[pos] == ']':
+                return
+            end: int = buffer.rfind('}', pos)
+            if batch and end >= 0:
+                try:
+                    records: list = json.loads('[' + buffer[pos:end + 1]
+                                               + ']')
+                except ValueError:
+                    batch = False
+                else:
+                    yield from records
+                    pos = end + 1
+                    continue
+            try:
+                if pos >= len(buffer):
+                    raise json.JSONDecodeError('Need more data', buffer, pos)
+                record, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                chunk = file.read(chunk_size)
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                batch = True
+                continue
+            yield record
+
+
+def open_text(path: Path) -> TextIO:
+    """ Open text file for reading, decompressed if it ends in .gz or .xz. """
+
+    if path.suffix == '.gz':
+        import gzip
+        return gzip.open(path, 'rt', encoding='utf-8')
+    if path.suffix == '.xz':
+        import lzma
+        return lzma.open(path, 'rt', encoding='utf-8')
+    return open(path, encoding='utf-8')
+
+
+def make_shortname(name: str) -> str:
+    """ Create a shortcode from a name, like ":thumbs_up:". """
+
+    return ':' + re.sub(r'[^a-z0-9+-]+', '_', name.lower()).strip('_') + ':'
+
+
+def parse_json_source(path: Path) -> Iterator[dict]:
+    """ Read records in the schema of emojis.json. """
+
+    for record in iter_json_records(path, 'emojis'):
+        emoji: str = (record.get('emoji') or '').strip()
+        name: str = (record.get('name') or '').strip()
+        if emoji and name:
+            yield {'emoji': emoji,
+                   'name': name,
+                   'category': (record.get('category') or '').strip(),
+                   'shortname': ((record.get('shortname') or '').strip()
+                                 or make_shortname(name))}
+
+
+def parse_emoji_test_source(path: Path) -> Iterator[dict]:
+    """ Read fully-qualified emojis of Unicode's emoji-test.txt.
+
+    A line looks like "1F600 ; fully-qualified # 😀 E1.0 grinning face" and
+    the category is made of the group and subgroup comments above, like
+    "Smileys & Emotion (face-smiling)".
+    """
+
+    group: str = ''
+    subgroup: str = ''
+    with open_text(path) as file:
+        for line in file:
+            if line.startswith('# group:'):
+                group = line.partition(':')[2].strip()
+            elif line.startswith('# subgroup:'):
+                subgroup = line.partition(':')[2].strip()
+            elif line.strip() and not line.startswith('#'):
+                status, _, comment = line.partition(';')[2].partition('#')
+                if status.strip() != 'fully-qualified':
+                    continue
+                parts: list[str] = comment.split(None, 2)
+                if len(parts) < 3:
+                    continue
+                yield {'emoji': parts[0],
+                       'name': parts[2].strip(),
+                       'category': f'{group} ({subgroup})',
+                       'shortname': make_shortname(parts[2])}
+
+
+def parse_text_source(path: Path) -> Iterator[dict]:
+    """ Read lines in the format of favorites, for custom lists.
+
+    A line looks like "☺️ smiling face ~ Smileys & Emotion (face-affection)",
+    the category is optional and lines starting with "#" are ignored.
+    """
+
+    with open_text(path) as file:
+        for line in file:
+            parts: list[str] = line.split(None, 1)
+            if len(parts) < 2 or parts[0].startswith('#'):
+                continue
+            name, _, category = parts[1].partition(' ~ ')
+            name = name.strip()
+            if name:
+                yield {'emoji': parts[0],
+                       'name': name,
+                       'category': category.strip() or 'Custom',
+                       'shortname': make_shortname(name)}
+
+
+# Parsers of option "--source" by format. A format is detected from the file
+# name or given as prefix, like "text:~/snippets.list".
+SOURCE_PARSERS: dict[str, Callable[[Path], Iterator[dict]]] = {
+    'json': parse_json_source,
+    'emoji-test': parse_emoji_test_source,
+    'text': parse_text_source,
+}
+
+
+def source_format(name: str) -> str:
+    """ Detect format of a source by its file name. """
+
+    name = name.lower().removesuffix('.gz').removesuffix('.xz')
+    if name.endswith('.json'):
+        return 'json'
+    if 'emoji-test' in name:
+        return 'emoji-test'
+    return 'text'
+
+
+def load_meta(path: Path) -> dict:
+    """ Read a JSON file of metadata, empty if it is missing or broken. """
+
+    import json
+
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def download_file(url: str, path: Path, meta_path: Path) -> bool:
+    """ Download URL to path, unless it did not change since last time.
+
+    The request is conditional with ETag and Last-Modified of the last
+    download from the same URL, which are kept in meta_path along with the
+    time of this check. On any error an existing file is kept and only
+    without one the error is raised. Returns True if a new file was
+    downloaded.
+    """
+
+    import json
+    import urllib.error
+    import urllib.request
+
+    meta: dict = load_meta(meta_path) if path.exists() else {}
+    request = urllib.request.Request(url)
+    if meta.get('url') == url:
+        if meta.get('etag'):
+            request.add_header('If-None-Match', meta['etag'])
+        if meta.get('last_modified'):
+            request.add_header('If-Modified-Since', meta['last_modified'])
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp: Path = temp_path(path)
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            with open(temp, 'wb') as file:
+                while chunk := response.read(1 << 16):
+                    file.write(chunk)
+            meta = {'url': url,
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified')}
+        temp.replace(path)
+        downloaded: bool = True
+    except urllib.error.HTTPError as error:
+        temp.unlink(missing_ok=True)
+        # Not modified, or a server error while the old file is still good.
+        if error.code != 304 and not path.exists():
+            raise
+        downloaded = False
+    except (urllib.error.URLError, OSError):
+        temp.unlink(missing_ok=True)
+        # Keep using the old file, if there is one.
+        if not path.exists():
+            raise
+        downloaded = False
+    meta['checked'] = time.time()
+    write_atomic(meta_path, json.dumps(meta).encode('utf-8'))
+    return downloaded
 
-        command: list[str] = []
-        command.append(self.programs['notify-send'].as_posix())
-        command.append('--urgency=low')
-        if self.selected_emoji:
-            command.append(self.selected_emoji)
-        notify_p: CompletedProcess | None = None
-        notify_p = subprocess.run(command,
-                                  stdin=subprocess.PIPE,
-                                  text=True,
-                                  check=True,
-                                  timeout=1)
-        return notify_p
 
-    def append_recents(self) -> bool:
-        """ Append the last selected emoji entry to the recents file. """
+# Longest name of a shortcode between the colons.
+SHORTCODE_SIZE: int = 64
+SHORTCODE_REGEX: re.Pattern = re.compile(
+    rb':[A-Za-z0-9_+\-]{1,%d}:' % SHORTCODE_SIZE)
 
-        if (not self.norecents
-                and self.db_recents
-                and self.selected_emoji
-                and self.selected_desc):
-            line: str = ''
-            if self.db_recents.exists():
-                line = '\n'
-                self.trim_recents_file()
-            line += self.selected_emoji + ' ' + self.selected_desc
-            with open(self.db_recents, 'a') as file:
-                file.write(line)
-            return True
-        else:
-            return False
 
-    def trim_recents_file(self) -> bool:
-        """ Shortens and strips recents file if it gets big. """
-
-        max_byte_size: int = 4096
-        max_list_entries: int = 50
-        if (self.db_recents
-                and self.db_recents.stat().st_size > max_byte_size):
-            data: str = self.db_recents.read_text().strip('\n')
-            recents_list: list = data.splitlines()
-            recents_list.reverse()
-            recents_list = list(dict.fromkeys(recents_list))
-            recents_list = recents_list[0:max_list_entries]
-            recents_list.reverse()
-            data = '\n'.join(recents_list)
-            self.db_recents.unlink(missing_ok=True)
-            self.db_recents.write_text(data)
-            return True
-        else:
-            return False
+def expand_shortcodes(source, target,
+                      lookup: Callable[[bytes], bytes | None],
+                      chunk_size: int = 1 << 20) -> None:
+    """ Copy a binary stream and replace shortcodes with emojis.
 
-    def print_version(self):
-        """ Print version and frozen state of this program. """
+    The stream is read in chunks of bytes, so memory stays the same for any
+    input size and long lines. A colon that ends an unknown shortcode can
+    start the next one, just like in a scan of the whole text. Only the
+    last bytes, which may be the start of a shortcode, are kept back until
+    the next chunk is read. Shortcodes found in the text are looked up only
+    once, until too many different ones were seen.
+    """
 
-        if self.frozen:
-            frozen = ' (pyinstaller)'
-        else:
-            frozen = ''
-        print(f'{self.name} v{self.version}{frozen}')
+    longest: int = SHORTCODE_SIZE + 2
+    found: dict[bytes, bytes | None] = {}
+    buffer: bytes = b''
+    while True:
+        data: bytes = source.read(chunk_size)
+        buffer = buffer + data if buffer else data
+        # Matches must start before this, to be complete in the buffer.
+        limit: int = len(buffer) if not data else len(buffer) - longest
+        parts: list[bytes] = []
+        done: int = 0
+        position: int = 0
+        while ((match := SHORTCODE_REGEX.search(buffer, position))
+                and match.start() < limit):
+            code: bytes = match.group()
+            emoji: bytes | None = found.get(code, b'')
+            if emoji == b'':
+                if len(found) >= 1 << 16:
+                    found.clear()
+                emoji = found[code] = lookup(code)
+            if emoji is None:
+                position = match.end() - 1
+            else:
+                parts.append(buffer[done:match.start()])
+                parts.append(emoji)
+                done = position = match.end()
+        cut: int = max(limit, position, done)
+        parts.append(buffer[done:cut])
+        target.write(b''.join(parts))
+        buffer = buffer[cut:]
+        if not data:
+            return None
 
-    def print_list_programs(self):
-        """ Print all program names and paths to stdout. """
 
-        for name, path in self.programs.items():
-            print(name + ':', path.as_posix())
+def temp_path(path: Path) -> Path:
+    """ Get name of a temporary file next to path, unique for the process. """
 
-    @classmethod
-    def which(cls, command: str) -> Path:
-        """ Find command in $PATH or get fullpath. """
+    return path.with_name(f'{path.name}.{os.getpid()}.tmp')
 
-        program: str | None = shutil.which(command)
-        path: Path
-        if program:
-            path = Path(program)
-        else:
-            path = fullpath(command)
-            if not path.is_file():
-                path = Path(command)
-        return path
+
+def write_atomic(path: Path, data: bytes) -> None:
+    """ Write data to a temporary file and rename it to path.
+
+    Readers see the old or the new file, never a part of it.
+    """
+
+    temp: Path = temp_path(path)
+    try:
+        temp.write_bytes(data)
+        temp.replace(path)
+    finally:
+        temp.unlink(missing_ok=True)
+    return None
 
 
 def fullpath(file: str) -> Path:
@@ -483,9 +3545,120 @@ def fullpath(file: str) -> Path:
     return path
 
 
+# Outputs of an emoji with their program, the seconds each may take and the
+# outputs it has to wait for. All others run at the same time, so an order
+# is only declared where it matters, in example a typing by pasting would
+# wait for ('clipboard',).
+OUTPUTS: dict[str, tuple[str, float, tuple[str, ...]]] = {
+    'clipboard': ('xclip', 2.0, ()),
+    'typing': ('xdotool', 1.0, ()),
+    'notify': ('notify-send', 1.0, ()),
+}
+
+
+# Default values of all commandline options, also used without parsing.
+DEFAULTS: dict = {
+    'version': False,
+    'list_programs': False,
+    'stdout': False,
+    'typing': False,
+    'clipboard': False,
+    'notify': False,
+    'nostdout': False,
+    'notyping': False,
+    'noclipboard': False,
+    'nonotify': False,
+    'rofi': 'rofi',
+    'dmenu': 'dmenu',
+    'pmenu': 'pmenu',
+    'fzf': 'fzf',
+    'xclip': 'xclip',
+    'xdotool': 'xdotool',
+    'notifysend': 'notify-send',
+    'menu': 'rofi',
+    'pattern': [],
+    'limit': 1,
+    'count': 1,
+    'unique': False,
+    'random_weight': 1.0,
+    'seed': None,
+    'matching_rofi': 'normal',
+    'ignore_case': False,
+    'noignore_case': False,
+    'url': ('https://gist.githubusercontent.com/thingsiplay/'
+            '1f500459bc117cf0b63e1f5c11e03963/raw/'
+            'd8e4b78cfe66862cf3809443c1dba017f37b61db/emojis.json'),
+    'source': [],
+    'offline': False,
+    'cache_dir': '~/.cache/emojicherrypick',
+    'refresh_after': 0,
+    'refresh_background': False,
+    'wipe_cache': False,
+    'noemojis': False,
+    'nobundle': False,
+    'recents': '~/.cache/emojicherrypick/recents.cherry',
+    'norecents': False,
+    'recents_size': 2,
+    'ignore_skin': True,
+    'favorites': '~/.config/emojicherrypick/favorites.cherry',
+    'nofavorites': False,
+    'prompt': '🍒',
+    'font_family': 'Noto Color Emoji',
+    'font_size': 16,
+    'list_size': 15,
+    'daemon': False,
+    'client': False,
+    'timings': False,
+    'timings_log': False,
+    'stats': False,
+    'backend': 'files',
+    'batch': False,
+    'batch_miss': '',
+    'batch_recents': False,
+    'expand': False,
+    'multi': False,
+}
+
+# Short options without a value, which can be read without building the
+# full parser in parse_arguments().
+FAST_FLAGS: dict[str, str] = {
+    'o': 'stdout',
+    't': 'typing',
+    'c': 'clipboard',
+    'n': 'notify',
+    'O': 'nostdout',
+    'T': 'notyping',
+    'C': 'noclipboard',
+    'N': 'nonotify',
+    'i': 'ignore_case',
+    'I': 'noignore_case',
+    'U': 'offline',
+    'w': 'wipe_cache',
+    'E': 'noemojis',
+    'R': 'norecents',
+    'F': 'nofavorites',
+}
+
+
+def parse_fast_arguments(args: list[str]) -> types.SimpleNamespace | None:
+    """ Read options made of FAST_FLAGS only, None for anything else. """
+
+    namespace = types.SimpleNamespace(**DEFAULTS)
+    for arg in args:
+        if (len(arg) < 2
+                or arg[0] != '-'
+                or not all(flag in FAST_FLAGS for flag in arg[1:])):
+            return None
+        for flag in arg[1:]:
+            setattr(namespace, FAST_FLAGS[flag], True)
+    return namespace
+
+
 def parse_arguments(args: list[str] | None = None) -> argparse.Namespace:
     """ Programs CLI options. """
 
+    import argparse
+
     parser = argparse.ArgumentParser(
         description=('🍒⛏️ Emoji Cherry Pick - Select an emoji and go wild.'),
         epilog=('Copyright © 2022 Tuncay D. '
@@ -494,23 +3667,47 @@ def parse_arguments(args: list[str] | None = None) -> argparse.Namespace:
 
     parser.add_argument(
         '--version',
-        default=False,
+        default=DEFAULTS['version'],
         action='store_true',
         help='print version and exit'
     )
 
     parser.add_argument(
         '--list-programs',
-        default=False,
+        default=DEFAULTS['list_programs'],
         action='store_true',
         help='list available programs and exit'
     )
 
+    parser.add_argument(
+        '--stats',
+        default=DEFAULTS['stats'],
+        action='store_true',
+        help=('print p50, p95 and p99 of each phase from the timings log '
+              'and exit, see option "--timings-log"')
+    )
+
+    parser.add_argument(
+        '--timings',
+        default=DEFAULTS['timings'],
+        action='store_true',
+        help=('print milliseconds spent in each phase as JSON to stderr '
+              'at exit')
+    )
+
+    parser.add_argument(
+        '--timings-log',
+        default=DEFAULTS['timings_log'],
+        action='store_true',
+        help=('add milliseconds spent in each phase to "timings.log" in the '
+              'cache dir, which keeps the last 1000 runs for "--stats"')
+    )
+
     p_enable_output = parser.add_argument_group('enable output')
 
     p_enable_output.add_argument(
         '-o', '--stdout',
-        default=False,
+        default=DEFAULTS['stdout'],
         action='store_true',
         help=('write selected emoji to stdout, unless option "--nostdout" '
               'is in effect')
@@ -518,7 +3715,7 @@ def parse_arguments(args: list[str] | None = None) -> argparse.Namespace:
 
     p_enable_output.add_argument(
         '-t', '--typing',
-        default=False,
+        default=DEFAULTS['typing'],
         action='store_true',
         help=('simulate typing out the emoji on the keyboard, unless option '
               '"--notyping" is in effect, typing can be unreliable and not '
@@ -527,7 +3724,7 @@ def parse_arguments(args: list[str] | None = None) -> argparse.Namespace:
 
     p_enable_output.add_argument(
         '-c', '--clipboard',
-        default=False,
+        default=DEFAULTS['clipboard'],
         action='store_true',
         help=('copy selected emoji to system clipboard, unless option '
               '"--noclipboard" is in effect')
@@ -535,7 +3732,7 @@ def parse_arguments(args: list[str] | None = None) -> argparse.Namespace:
 
     p_enable_output.add_argument(
         '-n', '--notify',
-        default=False,
+        default=DEFAULTS['notify'],
         action='store_true',
         help=('send selected emoji as a notification message, unless option '
               '"--nonotify" is in effect')
@@ -545,14 +3742,14 @@ def parse_arguments(args: list[str] | None = None) -> argparse.Namespace:
 
     p_disable_output.add_argument(
         '-O', '--nostdout',
-        default=False,
+        default=DEFAULTS['nostdout'],
         action='store_true',
         help='disable interaction with stdout, regardless of other options'
     )
 
     p_disable_output.add_argument(
         '-T', '--notyping',
-        default=False,
+        default=DEFAULTS['notyping'],
         action='store_true',
         help=('disable simulated typing to active window, regardless of '
               'other options')
@@ -560,7 +3757,7 @@ def parse_arguments(args: list[str] | None = None) -> argparse.Namespace:
 
     p_disable_output.add_argument(
         '-C', '--noclipboard',
-        default=False,
+        default=DEFAULTS['noclipboard'],
         action='store_true',
         help=('disable interaction with clipboard, regardless of other '
               'options')
@@ -568,7 +3765,7 @@ def parse_arguments(args: list[str] | None = None) -> argparse.Namespace:
 
     p_disable_output.add_argument(
         '-N', '--nonotify',
-        default=False,
+        default=DEFAULTS['nonotify'],
         action='store_true',
         help=('do not send any notification messages, regardless of other '
               'options')
@@ -579,7 +3776,7 @@ def parse_arguments(args: list[str] | None = None) -> argparse.Namespace:
     p_programs.add_argument(
         '--rofi',
         metavar='CMD',
-        default='rofi',
+        default=DEFAULTS['rofi'],
         help=('name or path to "rofi" program when option "--menu" is set to '
               '"rofi"')
     )
@@ -587,7 +3784,7 @@ def parse_arguments(args: list[str] | None = None) -> argparse.Namespace:
     p_programs.add_argument(
         '--dmenu',
         metavar='CMD',
-        default='dmenu',
+        default=DEFAULTS['dmenu'],
         help=('name or path to "dmenu" program when option "--menu" is set to '
               '"dmenu"')
     )
@@ -595,7 +3792,7 @@ def parse_arguments(args: list[str] | None = None) -> argparse.Namespace:
     p_programs.add_argument(
         '--pmenu',
         metavar='CMD',
-        default='pmenu',
+        default=DEFAULTS['pmenu'],
         help=('name or path to "pmenu" program when option "--menu" is set to '
               '"pmenu"')
     )
@@ -603,7 +3800,7 @@ def parse_arguments(args: list[str] | None = None) -> argparse.Namespace:
     p_programs.add_argument(
         '--fzf',
         metavar='CMD',
-        default='fzf',
+        default=DEFAULTS['fzf'],
         help=('name or path to "fzf" program when option "--menu" is set to '
               '"fzf"')
     )
@@ -611,7 +3808,7 @@ def parse_arguments(args: list[str] | None = None) -> argparse.Namespace:
     p_programs.add_argument(
         '--xclip',
         metavar='CMD',
-        default='xclip',
+        default=DEFAULTS['xclip'],
         help=('name or path to "xclip" program to handle clipboard when '
               'option "--clipboard" is active')
     )
@@ -619,7 +3816,7 @@ def parse_arguments(args: list[str] | None = None) -> argparse.Namespace:
     p_programs.add_argument(
         '--xdotool',
         metavar='CMD',
-        default='xdotool',
+        default=DEFAULTS['xdotool'],
         help=('name or path to "xdotool" program to handle typing when option '
               '"--typing" is active')
     )
@@ -627,38 +3824,143 @@ def parse_arguments(args: list[str] | None = None) -> argparse.Namespace:
     p_programs.add_argument(
         '--notifysend',
         metavar='CMD',
-        default='notify-send',
+        default=DEFAULTS['notifysend'],
         help=('name or path to "notify-send" program to handle notifications '
               'when option "--notify" is active')
     )
 
     p_menufilter = parser.add_argument_group('engines and filters')
 
-    default_menu: str = 'rofi'
+    default_menu: str = DEFAULTS['menu']
     p_menufilter.add_argument(
         '-M', '--menu',
         metavar='SYSTEM',
         default=default_menu,
-        choices=['rofi', 'dmenu', 'pmenu', 'fzf', 'filter', 'random', 'none'],
+        choices=['rofi', 'dmenu', 'pmenu', 'fzf', 'curses', 'filter',
+                 'fuzzy', 'random', 'none'],
         help=('change menu engine to select emojis, available systems: '
-              '"rofi", "dmenu", "pmenu", "fzf", "filter", "random", "none", '
-              'system "none" disables selection, "filter" won\'t display a '
-              'menu but choose first entry in the list that matches the text '
-              'at option "--pattern", systems "fzf" and "pmenu" are terminal '
-              'programs, "random" won\'t display a menu but choose an entry '
-              f'by random chance, defaults to: "{default_menu}"')
+              '"rofi", "dmenu", "pmenu", "fzf", "curses", "filter", "fuzzy", '
+              '"random", "none", system "none" disables selection, "filter" '
+              'won\'t display a menu but choose best entry in the list that '
+              'matches the words at option "--pattern", "fuzzy" is like '
+              '"filter" but matches characters in order like "fzf" without '
+              'running it, systems "fzf" and "pmenu" are terminal programs, '
+              '"curses" is a built-in terminal menu without other programs, '
+              'which starts with option "--pattern" as search, "random" '
+              'won\'t display a menu but choose an entry by random chance, '
+              f'defaults to: "{default_menu}"')
     )
 
     p_menufilter.add_argument(
         '-p', '--pattern',
         metavar='filter',
-        default='',
+        default=DEFAULTS['pattern'],
+        action='append',
         help=('simple text filter, used when option "--menu" is set to '
-              '"filter" or "fzf", causes in both cases to non interactive '
-              'selection of first emoji that matches the pattern')
+              '"filter", "fuzzy" or "fzf", causes in all cases to non '
+              'interactive selection of best emoji that matches the pattern, '
+              'can be given more than once with "filter" and "fuzzy" to '
+              'select the best match of each pattern')
+    )
+
+    p_menufilter.add_argument(
+        '--multi',
+        default=DEFAULTS['multi'],
+        action='store_true',
+        help=('allow to select more than one entry in menu "rofi" and '
+              '"fzf", all emojis are joined and sent at once to the outputs')
+    )
+
+    default_limit: int = DEFAULTS['limit']
+    p_menufilter.add_argument(
+        '--limit',
+        metavar='NUM',
+        default=default_limit,
+        type=int,
+        choices=range(1, 10000),
+        help=('number of best matches when option "--menu" is set to '
+              '"filter" or "fuzzy", if more than 1 then all matches are '
+              'listed to stdout as complete entries and no other output is '
+              'done and recents are not changed, defaults to: '
+              f'"{default_limit}"')
+    )
+
+    default_count: int = DEFAULTS['count']
+    p_menufilter.add_argument(
+        '--count',
+        metavar='NUM',
+        default=default_count,
+        type=int,
+        choices=range(1, 10000),
+        help=('number of emojis to draw when option "--menu" is set to '
+              '"random", all are joined and sent at once to the outputs, '
+              f'defaults to: "{default_count}"')
+    )
+
+    p_menufilter.add_argument(
+        '--unique',
+        default=DEFAULTS['unique'],
+        action='store_true',
+        help='draw each entry only once with option "--count"'
+    )
+
+    default_random_weight: float = DEFAULTS['random_weight']
+    p_menufilter.add_argument(
+        '--random-weight',
+        metavar='NUM',
+        default=default_random_weight,
+        type=float,
+        help=('chance of recents and favorites to be drawn by "--menu random" '
+              'compared to other emojis, in example 10 makes each of them 10 '
+              f'times more likely, defaults to: "{default_random_weight}"')
+    )
+
+    p_menufilter.add_argument(
+        '--seed',
+        metavar='NUM',
+        default=DEFAULTS['seed'],
+        type=int,
+        help=('start value of the random generator of "--menu random", the '
+              'same value draws the same emojis from the same lists, seeded '
+              'draws are not added to recents, so they can be repeated')
+    )
+
+    p_menufilter.add_argument(
+        '--batch',
+        default=DEFAULTS['batch'],
+        action='store_true',
+        help=('read one pattern per line from stdin and write the emoji of '
+              'the best match for each to stdout, with option "--limit" the '
+              'emojis of all matches separated by space, for option '
+              '"--menu" "filter" or "fuzzy", lists are loaded only once and '
+              'no other output is done')
+    )
+
+    default_batch_miss: str = DEFAULTS['batch_miss']
+    p_menufilter.add_argument(
+        '--batch-miss',
+        metavar='TEXT',
+        default=default_batch_miss,
+        help=('line to write in "--batch" mode if a pattern has no match, '
+              f'defaults to: "{default_batch_miss}"')
+    )
+
+    p_menufilter.add_argument(
+        '--batch-recents',
+        default=DEFAULTS['batch_recents'],
+        action='store_true',
+        help='add the matches of "--batch" mode to recents'
+    )
+
+    p_menufilter.add_argument(
+        '--expand',
+        default=DEFAULTS['expand'],
+        action='store_true',
+        help=('copy stdin to stdout and replace each known shortcode, such '
+              'as ":thumbs_up:", with its emoji, no other output is done')
     )
 
-    default_matching_rofi: str = 'normal'
+    default_matching_rofi: str = DEFAULTS['matching_rofi']
     p_menufilter.add_argument(
         '-m', '--matching-rofi',
         metavar='MODE',
@@ -671,7 +3973,7 @@ def parse_arguments(args: list[str] | None = None) -> argparse.Namespace:
 
     p_menufilter.add_argument(
         '-i', '--ignore-case',
-        default=False,
+        default=DEFAULTS['ignore_case'],
         action='store_true',
         help=('ignore case sensitivity when searching list of emojis, '
               'unless option "--noignore-case" is in effect')
@@ -679,16 +3981,14 @@ def parse_arguments(args: list[str] | None = None) -> argparse.Namespace:
 
     p_menufilter.add_argument(
         '-I', '--noignore-case',
-        default=False,
+        default=DEFAULTS['noignore_case'],
         action='store_true',
         help='case sensitive search of emojis, regardless of other options'
     )
 
     p_cache = parser.add_argument_group('cache files')
 
-    default_url = ('https://gist.githubusercontent.com/thingsiplay/'
-                   '1f500459bc117cf0b63e1f5c11e03963/raw/'
-                   'd8e4b78cfe66862cf3809443c1dba017f37b61db/emojis.json')
+    default_url = DEFAULTS['url']
     p_cache.add_argument(
         '-u', '--url',
         metavar='URL',
@@ -697,14 +3997,27 @@ def parse_arguments(args: list[str] | None = None) -> argparse.Namespace:
               f'to: "{default_url}"')
     )
 
+    p_cache.add_argument(
+        '--source',
+        metavar='SOURCE',
+        default=DEFAULTS['source'],
+        action='append',
+        help=('URL or file to merge into "emojis.json" instead of option '
+              '"--url", repeat it to merge multiple sources, the first source '
+              'of an emoji wins, format is detected by file name as "json", '
+              '"emoji-test" for Unicode\'s "emoji-test.txt" or "text" for '
+              'lines like in favorites, or given as prefix like '
+              '"text:FILE", files ending in ".gz" or ".xz" are decompressed')
+    )
+
     p_cache.add_argument(
         '-U', '--offline',
-        default=False,
+        default=DEFAULTS['offline'],
         action='store_true',
         help='prohibit downloading files from network, mainly "emojis.json"'
     )
 
-    default_cache: str = "~/.cache/emojicherrypick"
+    default_cache: str = DEFAULTS['cache_dir']
     p_cache.add_argument(
         '-d', '--cache-dir',
         metavar='DIR',
@@ -713,42 +4026,70 @@ def parse_arguments(args: list[str] | None = None) -> argparse.Namespace:
               f'used for quick access, defaults to: "{default_cache}"')
     )
 
+    default_refresh_after: float = DEFAULTS['refresh_after']
+    p_cache.add_argument(
+        '--refresh-after',
+        metavar='HOURS',
+        default=default_refresh_after,
+        type=float,
+        help=('check for an updated "emojis.json" if the last check is older '
+              'than given hours, only changed files are downloaded, 0 '
+              f'disables updates, defaults to: "{default_refresh_after}"')
+    )
+
+    p_cache.add_argument(
+        '--refresh-background',
+        default=DEFAULTS['refresh_background'],
+        action='store_true',
+        help=('use the existing cache right away and update it in a detached '
+              'process, if it is older than option "--refresh-after" or was '
+              'built with other options, the next run uses the new cache')
+    )
+
     p_cache.add_argument(
         '-w', '--wipe-cache',
-        default=False,
+        default=DEFAULTS['wipe_cache'],
         action='store_true',
         help=('delete temporary cache files, redownload and recreate them '
               'unless option "--offline" is in effect')
     )
 
+    p_cache.add_argument(
+        '--nobundle',
+        default=DEFAULTS['nobundle'],
+        action='store_true',
+        help=('do not use the emoji index shipped with the program, so '
+              '"emojis.json" is downloaded and built into the cache')
+    )
+
     p_cache.add_argument(
         '-E', '--noemojis',
-        default=False,
+        default=DEFAULTS['noemojis'],
         action='store_true',
         help=('disable loading from main emojis database created from '
               '"emojis.json"')
     )
 
-    default_recents: str = "~/.cache/emojicherrypick/recents.cherry"
+    default_recents: str = DEFAULTS['recents']
     p_cache.add_argument(
         '-r', '--recents',
         metavar='FILE',
         default=default_recents,
-        help=('program keeps track of last used emojis and saves them to '
-              'a history file, the last entries will be displayed at the top '
-              'of each emoji listing in the menus, same format as '
-              '"--favorites" file, use option "--recents-size" to set number '
-              f'of entries to show blah, defaults to: "{default_recents}"')
+        help=('program keeps track of used emojis and how often they are '
+              'used in a history file, the most frecently used entries will '
+              'be displayed at the top of each emoji listing in the menus, '
+              'use option "--recents-size" to set number of entries to '
+              f'show, defaults to: "{default_recents}"')
     )
 
     p_cache.add_argument(
         '-R', '--norecents',
-        default=False,
+        default=DEFAULTS['norecents'],
         action='store_true',
         help='disable recents file specified at option "--recents"'
     )
 
-    default_recents_size: int = 2
+    default_recents_size: int = DEFAULTS['recents_size']
     p_cache.add_argument(
         '-k', '--recents-size',
         metavar='NUM',
@@ -760,16 +4101,28 @@ def parse_arguments(args: list[str] | None = None) -> argparse.Namespace:
               f'defaults to: "{default_recents_size}"')
     )
 
+    default_backend: str = DEFAULTS['backend']
+    p_cache.add_argument(
+        '--backend',
+        default=default_backend,
+        choices=['files', 'sqlite'],
+        help=('store of emojis, favorites and recents: "files" uses the '
+              'binary index and text files, "sqlite" copies them to a single '
+              'SQLite database "emojis.db" in the cache dir with a full text '
+              'index for option "--menu filter", recents are then only '
+              f'recorded in it, defaults to: "{default_backend}"')
+    )
+
     p_cache.add_argument(
         '--ignore-skin',
-        default=True,
+        default=DEFAULTS['ignore_skin'],
         action=argparse.BooleanOptionalAction,
         help='ignore emoji skin variations when creating the cache'
     )
 
     p_config = parser.add_argument_group('config files')
 
-    default_favorites: str = "~/.config/emojicherrypick/favorites.cherry"
+    default_favorites: str = DEFAULTS['favorites']
     p_config.add_argument(
         '-f', '--favorites',
         metavar='FILE',
@@ -783,14 +4136,14 @@ def parse_arguments(args: list[str] | None = None) -> argparse.Namespace:
 
     p_config.add_argument(
         '-F', '--nofavorites',
-        default=False,
+        default=DEFAULTS['nofavorites'],
         action='store_true',
         help='disable favorites file specified at option "--favorites"'
     )
 
     p_menuinterface = parser.add_argument_group('menu interface')
 
-    default_prompt: str = '🍒'
+    default_prompt: str = DEFAULTS['prompt']
     p_menuinterface.add_argument(
         '-@', '--prompt',
         metavar='TEXT',
@@ -799,7 +4152,7 @@ def parse_arguments(args: list[str] | None = None) -> argparse.Namespace:
               f'defaults to: "{default_prompt}"')
     )
 
-    default_font_family: str = 'Noto Color Emoji'
+    default_font_family: str = DEFAULTS['font_family']
     p_menuinterface.add_argument(
         '-g', '--font-family',
         metavar='NAME',
@@ -808,7 +4161,7 @@ def parse_arguments(args: list[str] | None = None) -> argparse.Namespace:
               f'"{default_font_family}"')
     )
 
-    default_font_size: int = 16
+    default_font_size: int = DEFAULTS['font_size']
     p_menuinterface.add_argument(
         '-s', '--font-size',
         metavar='NUM',
@@ -819,7 +4172,7 @@ def parse_arguments(args: list[str] | None = None) -> argparse.Namespace:
               f'defaults to: "{default_font_size}"')
     )
 
-    default_list_size: int = 15
+    default_list_size: int = DEFAULTS['list_size']
     p_menuinterface.add_argument(
         '-l', '--list-size',
         metavar='NUM',
@@ -830,22 +4183,411 @@ def parse_arguments(args: list[str] | None = None) -> argparse.Namespace:
               f'"{default_list_size}"')
     )
 
+    p_daemon = parser.add_argument_group('daemon')
+
+    p_daemon.add_argument(
+        '--daemon',
+        default=DEFAULTS['daemon'],
+        action='store_true',
+        help=('run as a persistent process holding all emoji lists in '
+              'memory, listening on a Unix socket in "$XDG_RUNTIME_DIR"')
+    )
+
+    p_daemon.add_argument(
+        '--client',
+        default=DEFAULTS['client'],
+        action='store_true',
+        help=('send all other options to a running daemon and get the result '
+              'back, runs as usual if no daemon is reachable')
+    )
+
     if args is None:
         return parser.parse_args()
     else:
         return parser.parse_args(args)
 
 
+class EmojiIndex:
+    """ Emoji lists for use as a library, loaded once and shared by threads.
+
+    Options are the same as DEFAULTS, which are the long commandline options
+    with underscores. Construction downloads and builds the cache like a run
+    of the program, unless "offline" is set. Files are read on first use and
+    kept in memory, they are only read again when they changed on disk. All
+    methods can be called from multiple threads.
+
+        emojis = EmojiIndex(norecents=True)
+        emojis.search('party popper', limit=3)
+        emojis.lookup_shortcode('thumbs_up')
+    """
+
+    def __init__(self, **options) -> None:
+        """ Construct index with options and build the cache if needed. """
+
+        import threading
+
+        unknown: set[str] = set(options) - set(DEFAULTS)
+        if unknown:
+            raise TypeError(f'Unknown options: {", ".join(sorted(unknown))}')
+        self.options: dict = DEFAULTS | options
+        self.lock = threading.RLock()
+        self.app: App = App(types.SimpleNamespace(**self.options))
+        self.app.memo = {}
+
+    def current(self) -> App:
+        """ Get the application, which opens changed files again. """
+
+        app: App = self.app
+        app.index = None
+        app.tokens = None
+        app.database = None
+        return app
+
+    def search(self, pattern: str, limit: int = 1,
+               fuzzy=False) -> list[str]:
+        """ Get best matching entries, like "--menu filter" or "fuzzy". """
+
+        with self.lock:
+            app: App = self.current()
+            if fuzzy:
+                return app.fuzzy_search(pattern, limit)
+            return app.search(pattern, limit)
+
+    def random(self, count: int = 1, unique=False, weight: float = 1.0,
+               seed: int | None = None) -> list[str]:
+        """ Draw random entries, like "--menu random". """
+
+        with self.lock:
+            return self.current().draw_random(count, unique, weight, seed)
+
+    def lookup_shortcode(self, shortcode: str) -> str | None:
+        """ Get emoji of a shortcode, with or without the colons. """
+
+        if not shortcode.startswith(':'):
+            shortcode = f':{shortcode}:'
+        with self.lock:
+            emoji: bytes | None = self.current().lookup_shortcode(
+                shortcode.encode('utf-8'))
+        return None if emoji is None else str(emoji, 'utf-8')
+
+    def iter_entries(self) -> Iterator[str]:
+        """ Iterate over all entries, recents and favorites first. """
+
+        with self.lock:
+            entries: list[str] = self.current().load_emoji_list(aslist=True)
+        return iter(entries)
+
+    def refresh(self) -> bool:
+        """ Check for an updated emojis.json and rebuild the cache from it.
+
+        Follows option "refresh_after" and returns True if a new file was
+        downloaded.
+        """
+
+        with self.lock:
+            app: App = self.current()
+            downloaded: bool = False
+            if not app.offline and not app.noemojis:
+                downloaded = app.download_db_source()
+            app.filter_db_source()
+            return downloaded
+
+    def rebuild(self) -> None:
+        """ Build the cache again from emojis.json. """
+
+        with self.lock:
+            app: App = self.current()
+            app.close_index()
+            app.filter_db_source(force=True)
+        return None
+
+
+class ThreadStream:
+    """ Text stream writing to the stream set for the current thread.
+
+    Without one set, it writes to the default stream. The daemon uses it as
+    stdout and stderr, so each request captures its own output, while other
+    requests run at the same time.
+    """
+
+    def __init__(self, default) -> None:
+        """ Construct stream with default stream for all other threads. """
+
+        import threading
+
+        self.default = default
+        self.local = threading.local()
+
+    def current(self):
+        """ Get stream of the current thread or the default stream. """
+
+        stream = getattr(self.local, 'stream', None)
+        return self.default if stream is None else stream
+
+    def write(self, text: str) -> int:
+        return self.current().write(text)
+
+    def flush(self) -> None:
+        return self.current().flush()
+
+    def __getattr__(self, name: str):
+        return getattr(self.current(), name)
+
+
+class Daemon:
+    """ Persistent process serving selections over a Unix socket. """
+
+    # Menus running in a terminal need the tty of the client, so the daemon
+    # only prepares the command and list for them. The built-in menu
+    # "curses" runs in the client the same way.
+    terminal_menus: tuple[str, ...] = ('pmenu', 'fzf')
+
+    def __init__(self, path: Path) -> None:
+        """ Construct daemon with an empty memo for file contents. """
+
+        import threading
+
+        self.path: Path = path
+        self.memo: dict = {}
+        # Working directory and options are set up for one request at a
+        # time, menus and outputs of requests run at the same time.
+        self.setup_lock = threading.Lock()
+        self.stdout = ThreadStream(sys.stdout)
+        self.stderr = ThreadStream(sys.stderr)
+
+    def serve(self) -> int:
+        """ Listen on the socket and handle each client in a thread.
+
+        An open menu of one client does not block others, in example
+        scripted lookups with "--menu filter".
+        """
+
+        import signal
+        import socket
+        import threading
+
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.unlink(missing_ok=True)
+        sys.stdout = self.stdout
+        sys.stderr = self.stderr
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+            server.bind(self.path.as_posix())
+            self.path.chmod(0o600)
+            server.listen()
+            try:
+                while True:
+                    connection, _ = server.accept()
+                    threading.Thread(target=self.handle,
+                                     args=(connection,),
+                                     daemon=True).start()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                self.path.unlink(missing_ok=True)
+                sys.stdout = self.stdout.default
+                sys.stderr = self.stderr.default
+        return 0
+
+    def handle(self, connection: socket.socket) -> None:
+        """ Answer the request of a single client connection. """
+
+        with connection:
+            try:
+                request: dict = receive_message(connection)
+                send_message(connection, self.respond(request))
+            except (OSError, ValueError):
+                pass
+        return None
+
+    def respond(self, request: dict) -> dict:
+        """ Run request from client and get response with captured output. """
+
+        import io
+
+        stdout = io.StringIO()
+        stderr = io.StringIO()
+        response: dict = {}
+        code: int
+        self.stdout.local.stream = stdout
+        self.stderr.local.stream = stderr
+        try:
+            try:
+                with self.setup_lock:
+                    os.chdir(request.get('cwd', '/'))
+                    args: argparse.Namespace = parse_arguments(
+                        request['args'])
+                    if args.daemon:
+                        raise RuntimeError('Daemon can not start another '
+                                           'daemon.')
+                    if args.batch or args.expand:
+                        raise RuntimeError('Daemon can not read from stdin.')
+                    app: App = App(args)
+                    app.memo = self.memo
+                if 'selection' in request:
+                    app.update_selected_emojis(request['selection'])
+                    code = output_emoji(app)
+                elif (app.menu in self.terminal_menus
+                        and not app.list_version
+                        and not app.list_programs
+                        and not (app.menu == 'fzf' and app.pattern)):
+                    command, emoji_list = app.menu_request(app.menu)
+                    response['menu'] = command
+                    response['payload'] = ''.join(emoji_list)
+                    code = 0
+                elif (app.menu == 'curses'
+                        and not app.list_version
+                        and not app.list_programs):
+                    response['picker'] = {'prompt': app.prompt,
+                                          'list_size': app.list_size,
+                                          'multi': app.multi,
+                                          'ignore_case': app.ignore_case,
+                                          'query': app.pattern}
+                    response['payload'] = app.load_emoji_list()
+                    code = 0
+                else:
+                    code = run(app)
+                app.report_timings()
+            except SystemExit as error:
+                code = error.code if isinstance(error.code, int) else 2
+            except (RuntimeError, KeyError, OSError) as error:
+                print(error, file=sys.stderr)
+                code = 1
+            except Exception as error:
+                # A broken request must not stop the daemon.
+                print(f'{type(error).__name__}: {error}', file=sys.stderr)
+                code = 1
+        finally:
+            self.stdout.local.stream = None
+            self.stderr.local.stream = None
+        response['code'] = code
+        response['stdout'] = stdout.getvalue()
+        response['stderr'] = stderr.getvalue()
+        return response
+
+
+def socket_path() -> Path:
+    """ Get path of the Unix socket shared by daemon and client. """
+
+    import tempfile
+
+    runtime_dir: str | None = os.getenv('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        return Path(runtime_dir) / f'{App.name}.sock'
+    else:
+        return Path(tempfile.gettempdir()) / f'{App.name}-{os.getuid()}.sock'
+
+
+def send_message(connection: socket.socket, message: dict) -> None:
+    """ Write a single message as a line of JSON to the socket. """
+
+    import json
+
+    data: bytes = json.dumps(message).encode('utf-8') + b'\n'
+    connection.sendall(data)
+
+
+def receive_message(connection: socket.socket) -> dict:
+    """ Read a single message as a line of JSON from the socket. """
+
+    import json
+
+    with connection.makefile('rb') as file:
+        line: bytes = file.readline()
+    if not line:
+        raise ValueError('Connection closed without a message.')
+    return json.loads(line)
+
+
+def request_daemon(path: Path, message: dict) -> dict:
+    """ Send a message to the daemon and wait for its response. """
+
+    import socket
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(path.as_posix())
+        send_message(connection, message)
+        return receive_message(connection)
+
+
+def run_client(args: list[str]) -> int | None:
+    """ Let the daemon run the arguments, None if daemon is unreachable. """
+
+    import subprocess
+
+    message: dict = {'args': args, 'cwd': os.getcwd()}
+    path: Path = socket_path()
+    try:
+        response: dict = request_daemon(path, message)
+        if 'menu' in response:
+            try:
+                emojis = App.select_command_emojis(response['menu'],
+                                                   response['payload'])
+            except subprocess.SubprocessError:
+                return 1
+            message['selection'] = emojis
+            response = request_daemon(path, message)
+        elif 'picker' in response:
+            try:
+                lines: list[str] = pick_lines(
+                    response['payload'].splitlines(), **response['picker'])
+            except OSError:
+                return 1
+            message['selection'] = [line.split(' ', 1) for line in lines
+                                    if ' ' in line]
+            response = request_daemon(path, message)
+    except (OSError, ValueError):
+        # Daemon is not running or closed the connection without answer.
+        return None
+    sys.stdout.write(response.get('stdout', ''))
+    sys.stderr.write(response.get('stderr', ''))
+    return response.get('code', 1)
+
+
+def default_arguments() -> list[str]:
+    """ Get arguments used when program is run without options. """
+
+    return [os.getenv('EMOJICHERRYPICK_DEFAULT', default='-con')]
+
+
 def main(args: list[str] | None = None) -> int:
     """ Run the application. """
 
     app: App
-    if not args and not sys.argv[1:]:
-        args_default: list[str] = [os.getenv('EMOJICHERRYPICK_DEFAULT',
-                                   default='-con')]
-        app = App(parse_arguments(args_default))
-    else:
-        app = App(parse_arguments(args))
+    if args is None:
+        args = sys.argv[1:]
+    if ('--client' in args
+            and '--batch' not in args
+            and '--expand' not in args):
+        args = [arg for arg in args if arg != '--client']
+        if not args:
+            args = default_arguments()
+        code: int | None = run_client(args)
+        if code is not None:
+            return code
+    elif not args:
+        args = default_arguments()
+    namespace: argparse.Namespace | types.SimpleNamespace | None
+    namespace = parse_fast_arguments(args)
+    if namespace is None:
+        namespace = parse_arguments(args)
+    if namespace.daemon:
+        return Daemon(socket_path()).serve()
+    try:
+        app = App(namespace)
+    except FileNotFoundError as error:
+        # A local file of option "--source" is missing.
+        print(error, file=sys.stderr)
+        return 1
+    code: int = run(app)
+    app.report_timings()
+    return code
+
+
+def run(app: App) -> int:
+    """ Select an emoji with the configured menu and output it. """
+
+    import subprocess
 
     if app.list_version:
         app.print_version()
@@ -853,39 +4595,105 @@ def main(args: list[str] | None = None) -> int:
     elif app.list_programs:
         app.print_list_programs()
         return 0
+    elif app.list_stats:
+        app.print_stats()
+        return 0
+    elif app.batch:
+        return run_batch(app)
+    elif app.expand:
+        return run_expand(app)
 
     try:
-        if app.menu == 'rofi':
-            app.select_by_rofi()
-        elif app.menu == 'dmenu':
-            app.select_by_dmenu()
-        elif app.menu == 'pmenu':
-            app.select_by_pmenu()
-        elif app.menu == 'fzf':
-            app.select_by_fzf()
-        elif app.menu == 'filter':
-            app.select_by_filter()
-        elif app.menu == 'random':
-            app.select_by_random()
-        elif app.menu == 'none':
-            app.select_by_none()
-        else:
-            raise RuntimeError('Unkown menu option.')
-            return -1
+        with app.timings.phase('menu'):
+            if app.menu == 'rofi':
+                app.select_by_rofi()
+            elif app.menu == 'dmenu':
+                app.select_by_dmenu()
+            elif app.menu == 'pmenu':
+                app.select_by_pmenu()
+            elif app.menu == 'fzf':
+                app.select_by_fzf()
+            elif app.menu == 'curses':
+                app.select_by_curses()
+            elif app.menu == 'filter':
+                app.select_by_filter()
+            elif app.menu == 'fuzzy':
+                app.select_by_fuzzy()
+            elif app.menu == 'random':
+                app.select_by_random()
+            elif app.menu == 'none':
+                app.select_by_none()
+            else:
+                raise RuntimeError('Unkown menu option.')
+                return -1
     except subprocess.SubprocessError:
         return 1
 
+    if app.matches:
+        for line in app.matches:
+            print(line)
+        return 0
+
+    return output_emoji(app)
+
+
+def run_batch(app: App) -> int:
+    """ Write best matches for each pattern from stdin, one line each. """
+
+    search: Callable[[str, int], list[str]]
+    if app.menu == 'filter':
+        search = app.search
+    elif app.menu == 'fuzzy':
+        search = app.fuzzy_search
+    else:
+        print('Option "--batch" needs option "--menu" set to "filter" or '
+              '"fuzzy".', file=sys.stderr)
+        return 1
+    # Files are read once and only checked for changes on each pattern.
+    if app.memo is None:
+        app.memo = {}
+    # Results of repeated patterns, unless recents change the ranking.
+    results: dict[str, list[str]] = {}
+    for pattern in sys.stdin:
+        pattern = pattern.rstrip('\n')
+        matches: list[str] | None = results.get(pattern)
+        if matches is None:
+            matches = search(pattern, app.limit) if pattern else []
+            if not app.batch_recents:
+                if len(results) >= 4096:
+                    results.clear()
+                results[pattern] = matches
+        emojis: list[str] = [line.split(' ', 1)[0] for line in matches]
+        print(' '.join(emojis) if emojis else app.batch_miss, flush=True)
+        if app.batch_recents and matches:
+            app.update_selected_emoji(matches[0].split(' ', 1))
+    return 0
+
+
+def run_expand(app: App) -> int:
+    """ Copy stdin to stdout with shortcodes replaced by emojis. """
+
+    sys.stdout.flush()
+    index: CherryIndex | None = app.open_index()
+    expand_shortcodes(sys.stdin.buffer, sys.stdout.buffer,
+                      index.shortcode if index else lambda code: None)
+    sys.stdout.buffer.flush()
+    return 0
+
+
+def output_emoji(app: App) -> int:
+    """ Send selected emoji to all enabled outputs. """
+
     if app.selected_emoji:
-        try:
-            if app.stdout:
-                app.send_emoji_to_stdout()
-            if app.clipboard:
-                app.send_emoji_to_clipboard()
-            if app.typing:
-                app.send_emoji_to_typing()
-            if app.notify:
-                app.send_emoji_to_notify()
-        except subprocess.SubprocessError:
+        if app.stdout:
+            app.send_emoji_to_stdout()
+        outputs: list[str] = [name for name in OUTPUTS
+                              if getattr(app, name)]
+        errors: dict[str, Exception] = dispatch_outputs(app, outputs)
+        for name, error in errors.items():
+            reason: str = f': {error}' if str(error) else '.'
+            print(f'Output "{name}" failed{reason}', file=sys.stderr)
+        if errors:
             return 3
     elif app.menu == 'none':
         return 0
@@ -894,5 +4702,53 @@ def main(args: list[str] | None = None) -> int:
     return 0
 
 
+def dispatch_outputs(app: App, outputs: list[str]) -> dict[str, Exception]:
+    """ Run outputs at the same time and get errors of the failed ones.
+
+    Each output runs in its own thread with its timeout from OUTPUTS, after
+    the outputs it has to wait for are done. It is not run, if one of them
+    failed. A single output runs without a thread. Programs are looked up
+    before, as the lookup is not thread safe.
+    """
+
+    import subprocess
+    import threading
+
+    done: dict[str, threading.Event] = {name: threading.Event()
+                                        for name in outputs}
+    errors: dict[str, Exception] = {}
+
+    def send(name: str) -> None:
+        _, timeout, after = OUTPUTS[name]
+        try:
+            for other in after:
+                if other in done:
+                    done[other].wait()
+                if other in errors:
+                    raise RuntimeError(f'Output "{other}" failed before.')
+            start: float = time.perf_counter()
+            try:
+                getattr(app, f'send_emoji_to_{name}')(timeout)
+            finally:
+                app.timings.add(name, (time.perf_counter() - start) * 1000)
+        except (subprocess.SubprocessError, OSError, RuntimeError) as error:
+            errors[name] = error
+        finally:
+            done[name].set()
+
+    for name in outputs:
+        app.programs[OUTPUTS[name][0]]
+    if len(outputs) == 1:
+        send(outputs[0])
+    else:
+        threads: list[threading.Thread] = [
+            threading.Thread(target=send, args=(name,)) for name in outputs]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return {name: errors[name] for name in outputs if name in errors}
+
+
 if __name__ == '__main__':
     sys.exit(main())